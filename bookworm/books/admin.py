@@ -1,7 +1,86 @@
+from django import forms
 from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 
+from .images import rendition_url
 from .models import Author, Book, Genre, Review
+from .signals import book_status_changed
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """
+    Filter a changelist by a foreign key, picking the related object with
+    the admin's autocomplete select: it searches and pages through them
+    instead of listing them all in the sidebar. The related model's admin
+    needs search_fields, and the filtered one must be an
+    AutocompleteFilterAdmin, which loads the widget's scripts.
+
+    Attributes:
+        field_name (str): The foreign key to filter by.
+    """
+    template = 'admin/books/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        field = model._meta.get_field(self.field_name)
+        self.parameter_name = f'{self.field_name}__{field.target_field.name}__exact'
+        super().__init__(request, params, model, model_admin)
+        widget = AutocompleteSelect(field, model_admin.admin_site, attrs={'style': 'width: 100%'})
+        # The widget gets the choices it looks the selected object up in from its form field.
+        self.widget = field.formfield(widget=widget, required=False).widget
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            return queryset.filter(**{self.parameter_name: self.value()})
+        except (ValueError, ValidationError) as e:
+            raise IncorrectLookupParameters(e)
+
+    def choices(self, changelist):
+        yield {
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'widget': self.widget.render(self.parameter_name, self.value()),
+        }
+
+
+class AuthorFilter(AutocompleteFilter):
+    title = 'author'
+    field_name = 'author'
+
+
+class UserFilter(AutocompleteFilter):
+    title = 'user'
+    field_name = 'user'
+
+
+class BookFilter(AutocompleteFilter):
+    title = 'book'
+    field_name = 'book'
+
+
+class AutocompleteFilterAdmin(admin.ModelAdmin):
+    """Load the scripts of the AutocompleteFilters in list_filter."""
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if isinstance(list_filter, type) and issubclass(list_filter, AutocompleteFilter):
+                field = self.model._meta.get_field(list_filter.field_name)
+                media += AutocompleteSelect(field, self.admin_site).media
+                media += forms.Media(js=['admin/js/jquery.init.js', 'books/js/autocomplete_filter.js'])
+        return media
 
 
 class BookGenreInline(admin.TabularInline):
@@ -9,16 +88,20 @@ class BookGenreInline(admin.TabularInline):
 
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'author', 'first_published', 'get_html_image', 'time_create', 'time_update', 'average_rating', 'status', 'tag_list', 'user')
+class BookAdmin(AutocompleteFilterAdmin):
+    list_display = ('id', 'title', 'author', 'first_published', 'get_html_image', 'time_create', 'time_update',
+                    'average_rating', 'reviews_count', 'status', 'tag_list', 'user')
     list_display_links = ('title', )
     list_editable = ('status', )
+    # The user is nullable, so Django would not join it by itself.
+    list_select_related = ('author', 'user')
     prepopulated_fields = {'slug': ('title', )}
     readonly_fields = ('get_html_image', 'time_create', 'time_update')
     ordering = ('id', )
     actions = ['set_published', 'set_draft']
     search_fields = ['title', 'author__name']
-    list_filter = ['author__name', 'status', 'user']
+    list_filter = ['status', AuthorFilter, UserFilter]
+    autocomplete_fields = ['author', 'user']
     inlines = [BookGenreInline]
     exclude = ['genre']
     save_on_top = True
@@ -29,16 +112,22 @@ class BookAdmin(admin.ModelAdmin):
     def tag_list(self, obj):
         return u", ".join(o.name for o in obj.tags.all())
 
+    @admin.display(description='Average rating', ordering='rating_avg')
+    def average_rating(self, obj):
+        return obj.average_rating()
+
     def get_html_image(self, object):
         if object.image:
-            return mark_safe(f"<img src='{object.image.url}' width=50>")
+            return mark_safe(f"<img src='{rendition_url(object.image, 100)}' width=50>")
         return 'No image'
 
     get_html_image.short_description = "Image miniature"
 
     @admin.action(description='Publish selected books')
     def set_published(self, request, queryset):
-        count = queryset.update(status=Book.Status.PUBLISHED)
+        book_ids = list(queryset.exclude(status=Book.Status.PUBLISHED).values_list('pk', flat=True))
+        count = queryset.update(status=Book.Status.PUBLISHED, time_update=timezone.now())
+        book_status_changed.send(sender=Book, book_ids=book_ids)
         if count > 1:
             self.message_user(request, f'{count} books were published')
         else:
@@ -46,7 +135,9 @@ class BookAdmin(admin.ModelAdmin):
 
     @admin.action(description='Unpublish selected books')
     def set_draft(self, request, queryset):
-        count = queryset.update(status=Book.Status.DRAFT)
+        book_ids = list(queryset.exclude(status=Book.Status.DRAFT).values_list('pk', flat=True))
+        count = queryset.update(status=Book.Status.DRAFT, time_update=timezone.now())
+        book_status_changed.send(sender=Book, book_ids=book_ids)
         if count > 1:
             self.message_user(request, f'{count} books were withdrawn from publication!', messages.WARNING)
         else:
@@ -63,21 +154,39 @@ class GenreAdmin(admin.ModelAdmin):
 
 @admin.register(Author)
 class AuthorAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'get_html_photo')
+    list_display = ('id', 'name', 'book_count', 'published_count', 'get_html_photo')
     list_display_links = ('id', 'name')
     readonly_fields = ('get_html_photo', )
     prepopulated_fields = {'slug': ('name', )}
     ordering = ('name', )
+    search_fields = ('name', )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            book_count=Count('books'),
+            published_count=Count('books', filter=Q(books__status=Book.Status.PUBLISHED)),
+        )
+
+    @admin.display(description='Books', ordering='book_count')
+    def book_count(self, obj):
+        return obj.book_count
+
+    @admin.display(description='Published', ordering='published_count')
+    def published_count(self, obj):
+        return obj.published_count
 
     def get_html_photo(self, object):
         if object.photo:
-            return mark_safe(f"<img src='{object.photo.url}' width=50>")
+            return mark_safe(f"<img src='{rendition_url(object.photo, 100)}' width=50>")
         return 'No photo'
 
     get_html_photo.short_description = "Photo miniature"
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(AutocompleteFilterAdmin):
     list_display = ('id', 'book', 'user', 'rating', 'time_create')
     list_display_links = ('id', )
+    list_select_related = ('book', 'user')
+    list_filter = ['rating', BookFilter, UserFilter]
+    autocomplete_fields = ['book', 'user']
@@ -0,0 +1,150 @@
+from django.db.models import Count, Q
+from taggit.models import Tag
+
+from books.models import Author, Book, Genre, Review
+
+
+def file_url(fieldfile):
+    return fieldfile.url if fieldfile else None
+
+
+class Field:
+    """
+    One output field of a resource: how to read it from an object and which
+    relations must be joined or prefetched for that read to cost no query.
+    """
+    def __init__(self, getter, select_related=(), prefetch_related=()):
+        self.getter = getter
+        self.select_related = select_related
+        self.prefetch_related = prefetch_related
+
+
+class Resource:
+    """
+    A read-only API resource.
+
+    The queryset of a request only joins and prefetches what the selected
+    fields need, so the query count of each endpoint is fixed and documented
+    on its resource. Resources list all the objects of ``model`` unless they
+    override get_base_queryset().
+    """
+    model = None
+    fields = {}
+    default_fields = None
+    filters = {}
+
+    def get_base_queryset(self):
+        return self.model._default_manager.all()
+
+    def get_queryset(self, field_names, params):
+        queryset = self.get_base_queryset()
+        for param, lookup in self.filters.items():
+            if params.get(param):
+                queryset = queryset.filter(**{lookup: params[param]})
+        select_related, prefetch_related = set(), set()
+        for name in field_names:
+            select_related.update(self.fields[name].select_related)
+            prefetch_related.update(self.fields[name].prefetch_related)
+        if select_related:
+            queryset = queryset.select_related(*sorted(select_related))
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*sorted(prefetch_related))
+        return queryset
+
+    def serialize(self, obj, field_names):
+        return {name: self.fields[name].getter(obj) for name in field_names}
+
+
+class BookResource(Resource):
+    """
+    Published books.
+
+    Queries per page (or per streamed chunk): 1, plus 1 each when 'genres'
+    or 'tags' is selected.
+    """
+    model = Book
+    fields = {
+        'id': Field(lambda b: b.pk),
+        'slug': Field(lambda b: b.slug),
+        'title': Field(lambda b: b.title),
+        'url': Field(lambda b: b.get_absolute_url()),
+        'author': Field(lambda b: b.author.slug, select_related=['author']),
+        'author_name': Field(lambda b: b.author.name, select_related=['author']),
+        'genres': Field(lambda b: [genre.slug for genre in b.genre.all()], prefetch_related=['genre']),
+        'tags': Field(lambda b: [tag.slug for tag in b.tags.all()], prefetch_related=['tags']),
+        'first_published': Field(lambda b: b.first_published),
+        'description': Field(lambda b: b.description),
+        'quote': Field(lambda b: b.quote),
+        'image': Field(lambda b: file_url(b.image)),
+        'reviews_count': Field(lambda b: b.reviews_count),
+        'rating': Field(lambda b: round(b.rating_avg, 2) if b.reviews_count else None),
+        'time_create': Field(lambda b: b.time_create),
+        'time_update': Field(lambda b: b.time_update),
+    }
+    default_fields = ['id', 'slug', 'title', 'url', 'author', 'genres', 'tags', 'first_published',
+                      'reviews_count', 'rating']
+    filters = {'author': 'author__slug', 'genre': 'genre__slug', 'tag': 'tags__slug'}
+
+    def get_base_queryset(self):
+        return Book.published.all()
+
+
+class AuthorResource(Resource):
+    """Authors. Queries per page (or per streamed chunk): 1."""
+    model = Author
+    fields = {
+        'id': Field(lambda a: a.pk),
+        'slug': Field(lambda a: a.slug),
+        'name': Field(lambda a: a.name),
+        'url': Field(lambda a: a.get_absolute_url()),
+        'description': Field(lambda a: a.description),
+        'photo': Field(lambda a: file_url(a.photo)),
+    }
+    default_fields = ['id', 'slug', 'name', 'url', 'photo']
+
+
+class GenreResource(Resource):
+    """Genres with their number of published books. Queries per page (or per streamed chunk): 1."""
+    model = Genre
+    fields = {
+        'id': Field(lambda g: g.pk),
+        'slug': Field(lambda g: g.slug),
+        'title': Field(lambda g: g.title),
+        'url': Field(lambda g: g.get_absolute_url()),
+        'book_count': Field(lambda g: g.book_count),
+    }
+
+    def get_base_queryset(self):
+        return Genre.objects.annotate(book_count=Count('books', filter=Q(books__status=Book.Status.PUBLISHED)))
+
+
+class TagResource(Resource):
+    """Tags. Queries per page (or per streamed chunk): 1."""
+    model = Tag
+    fields = {
+        'id': Field(lambda t: t.pk),
+        'slug': Field(lambda t: t.slug),
+        'name': Field(lambda t: t.name),
+    }
+
+
+class ReviewResource(Resource):
+    """
+    Reviews of published books.
+
+    Queries per page (or per streamed chunk): 1; the book and the user are
+    joined only when selected.
+    """
+    model = Review
+    fields = {
+        'id': Field(lambda r: r.pk),
+        'book': Field(lambda r: r.book.slug, select_related=['book']),
+        'user': Field(lambda r: r.user.username, select_related=['user']),
+        'rating': Field(lambda r: r.rating),
+        'text': Field(lambda r: r.text),
+        'time_create': Field(lambda r: r.time_create),
+    }
+    filters = {'book': 'book__slug', 'user': 'user__username'}
+
+    def get_base_queryset(self):
+        return Review.objects.filter(book__status=Book.Status.PUBLISHED)
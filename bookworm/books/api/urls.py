@@ -0,0 +1,18 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('books/', views.BookList.as_view(), name='books'),
+    path('books/<slug:slug>/', views.BookDetail.as_view(), name='book'),
+    path('authors/', views.AuthorList.as_view(), name='authors'),
+    path('authors/<slug:slug>/', views.AuthorDetail.as_view(), name='author'),
+    path('genres/', views.GenreList.as_view(), name='genres'),
+    path('tags/', views.TagList.as_view(), name='tags'),
+    path('reviews/', views.ReviewList.as_view(), name='reviews'),
+    path('autocomplete/authors/', views.AuthorAutocomplete.as_view(), name='autocomplete_authors'),
+    path('autocomplete/genres/', views.GenreAutocomplete.as_view(), name='autocomplete_genres'),
+    path('autocomplete/tags/', views.TagAutocomplete.as_view(), name='autocomplete_tags'),
+]
@@ -0,0 +1,218 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.text import slugify
+from django.views import View
+from taggit.models import Tag
+
+from books.models import Author, Genre
+from books.pagination import CursorPaginator, InvalidCursor
+
+from .resources import AuthorResource, BookResource, GenreResource, ReviewResource, TagResource
+
+
+# Greater than any character, so that values starting with a prefix sort below prefix + LAST_CHAR.
+LAST_CHAR = '\U0010ffff'
+
+
+def json_error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def prefix_range(field_name, prefix):
+    """
+    Get the lookups that match the values of a field starting with a prefix,
+    as a range that an index on the field serves (LIKE cannot use one).
+
+    Returns:
+        dict: The lookups.
+    """
+    return {f'{field_name}__gte': prefix, f'{field_name}__lt': prefix + LAST_CHAR}
+
+
+class ApiView(View):
+    """
+    Read-only JSON listing of a resource.
+
+    Query parameters:
+        fields: comma-separated output fields (defaults to the resource's default fields).
+        cursor: opaque position returned as 'next' or 'previous' by the previous page.
+        limit: page size, up to API_MAX_PAGE_SIZE.
+        stream: '1' to stream every matching object as one JSON array instead of a page.
+
+    Pages are keyset-paginated on the primary key and never count rows.
+    """
+    http_method_names = ['get', 'head', 'options']
+    resource = None
+
+    def get_field_names(self):
+        requested = self.request.GET.get('fields')
+        if not requested:
+            return self.resource.default_fields or list(self.resource.fields)
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.resource.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(self.resource.fields)}")
+        return names
+
+    def get(self, request, *args, **kwargs):
+        try:
+            field_names = self.get_field_names()
+        except ValueError as e:
+            return json_error(str(e))
+        queryset = self.resource.get_queryset(field_names, {**request.GET.dict(), **kwargs})
+        if request.GET.get('stream') == '1':
+            return self.stream(queryset, field_names)
+        return self.page(queryset, field_names)
+
+    def page(self, queryset, field_names):
+        try:
+            limit = min(int(self.request.GET.get('limit', settings.API_PAGE_SIZE)), settings.API_MAX_PAGE_SIZE)
+        except ValueError:
+            return json_error('limit must be an integer')
+        if limit < 1:
+            return json_error('limit must be positive')
+        try:
+            page = CursorPaginator(queryset, limit, ordering='pk').page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            return json_error('Invalid cursor')
+        return JsonResponse({
+            'results': [self.resource.serialize(obj, field_names) for obj in page],
+            'next': self.cursor_url(page.next_cursor),
+            'previous': self.cursor_url(page.previous_cursor),
+        })
+
+    def cursor_url(self, cursor):
+        if cursor is None:
+            return None
+        params = self.request.GET.copy()
+        params['cursor'] = cursor
+        return self.request.build_absolute_uri(f'{self.request.path}?{params.urlencode()}')
+
+    def stream(self, queryset, field_names):
+        """
+        Stream the whole listing as a JSON array.
+
+        Rows are read with iterator(chunk_size=...), which applies the
+        prefetches chunk by chunk, so memory stays flat however many objects
+        are exported.
+        """
+        encoder = DjangoJSONEncoder()
+        objects = queryset.order_by('pk').iterator(chunk_size=settings.API_STREAM_CHUNK_SIZE)
+
+        def content():
+            yield '['
+            for number, obj in enumerate(objects):
+                yield (',\n' if number else '\n') + encoder.encode(self.resource.serialize(obj, field_names))
+            yield '\n]\n'
+
+        return StreamingHttpResponse(content(), content_type='application/json')
+
+
+class ApiDetailView(ApiView):
+    """Read-only JSON view of one object of a resource, looked up by slug."""
+    def get(self, request, *args, **kwargs):
+        try:
+            field_names = self.get_field_names()
+        except ValueError as e:
+            return json_error(str(e))
+        obj = self.resource.get_queryset(field_names, {}).filter(slug=kwargs['slug']).first()
+        if obj is None:
+            raise Http404
+        return JsonResponse(self.resource.serialize(obj, field_names), encoder=DjangoJSONEncoder)
+
+
+class BookList(ApiView):
+    resource = BookResource()
+
+
+class BookDetail(ApiDetailView):
+    resource = BookResource()
+
+
+class AuthorList(ApiView):
+    resource = AuthorResource()
+
+
+class AuthorDetail(ApiDetailView):
+    resource = AuthorResource()
+
+
+class GenreList(ApiView):
+    resource = GenreResource()
+
+
+class TagList(ApiView):
+    resource = TagResource()
+
+
+class ReviewList(ApiView):
+    resource = ReviewResource()
+
+
+class AutocompleteView(View):
+    """
+    Suggestions for a form field: the objects whose ``text_field`` starts
+    with the ``q`` parameter, ignoring case, in that order.
+
+    Query parameters:
+        q: the typed prefix.
+        limit: number of suggestions, up to API_MAX_PAGE_SIZE.
+
+    Returns ``{"results": [{"id": ..., "text": ...}]}`` from a single range
+    scan of an index, however large the table. The prefix is matched against
+    ``search_field``, an indexed copy of ``text_field`` casefolded in Python,
+    since SQLite's LOWER() leaves non-ASCII letters as they are.
+    """
+    http_method_names = ['get', 'head', 'options']
+    model = None
+    text_field = None
+    search_field = None
+
+    def get_queryset(self, term):
+        return (self.model._default_manager.filter(**prefix_range(self.search_field, term.casefold()))
+                .order_by(self.search_field).values_list('pk', self.text_field))
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.GET.get('limit', settings.AUTOCOMPLETE_LIMIT)), settings.API_MAX_PAGE_SIZE)
+        except ValueError:
+            return json_error('limit must be an integer')
+        if limit < 1:
+            return json_error('limit must be positive')
+        term = request.GET.get('q', '').strip()
+        response = JsonResponse({
+            'results': [{'id': pk, 'text': text} for pk, text in self.get_queryset(term)[:limit]],
+        })
+        patch_cache_control(response, public=True, max_age=settings.AUTOCOMPLETE_MAX_AGE)
+        return response
+
+
+class AuthorAutocomplete(AutocompleteView):
+    model = Author
+    text_field = 'name'
+    search_field = 'name_casefold'
+
+
+class GenreAutocomplete(AutocompleteView):
+    model = Genre
+    text_field = 'title'
+    search_field = 'title_casefold'
+
+
+class TagAutocomplete(AutocompleteView):
+    """
+    Tags are matched on their slug, which is lowercase and has a unique
+    index. A term without any slug character matches no tag.
+    """
+    model = Tag
+    text_field = 'name'
+    search_field = 'slug'
+
+    def get_queryset(self, term):
+        # taggit keeps unicode in slugs unless TAGGIT_STRIP_UNICODE_WHEN_SLUGIFYING is set.
+        slug = slugify(term, allow_unicode=True)
+        if not slug:
+            return Tag.objects.none()
+        return Tag.objects.filter(**prefix_range('slug', slug)).order_by('slug').values_list('pk', 'name')
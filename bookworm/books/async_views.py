@@ -0,0 +1,76 @@
+"""
+Async versions of the read-only book pages.
+
+They subclass the views of the same name in views.py and are routed
+instead of them when the ASYNC_VIEWS setting is on, so under ASGI these
+pages are served on the event loop rather than on a worker thread. Queries
+that do not depend on each other are gathered.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from taggit.models import Tag
+
+from . import views
+from .models import Author, Book, Genre, Review
+from .pagination import alist
+from .utils import AsyncBookListMixin, AsyncConditionalGetMixin, aget_object_or_404
+
+
+class BookHome(AsyncBookListMixin, views.BookHome):
+    pass
+
+
+class BookByTag(AsyncBookListMixin, views.BookByTag):
+    async def get(self, request, *args, **kwargs):
+        # get_queryset() filters by the tag, so it has to be loaded first.
+        self.tag = await aget_object_or_404(Tag.objects, slug=self.kwargs['tag'])
+        return await super().get(request, *args, **kwargs)
+
+    async def aget_page_context(self):
+        return {'title': f'Books by tag: #{self.tag.name}'}
+
+
+class BookGenre(AsyncBookListMixin, views.BookGenre):
+    async def aget_page_context(self):
+        self.genre = await aget_object_or_404(Genre.objects, slug=self.kwargs['genre_slug'])
+        return {'title': 'Genre: ' + self.genre.title, 'genre_selected': self.genre.pk}
+
+
+class ShowAuthor(AsyncBookListMixin, views.ShowAuthor):
+    async def get(self, request, *args, **kwargs):
+        # get_queryset() filters by the author, so it has to be loaded first.
+        self.author = await aget_object_or_404(Author.objects, slug=self.kwargs['author_slug'])
+        return await super().get(request, *args, **kwargs)
+
+    async def aget_author_stats(self):
+        if self.stats is None:
+            stats = await Book.published.filter(author=self.author).aaggregate(**self.stats_aggregates())
+            self.stats = self.describe_stats(stats)
+        return self.stats
+
+    async def aget_freshness(self):
+        freshness, stats = await asyncio.gather(super().aget_freshness(), self.aget_author_stats())
+        return self.describe_author_page(freshness, stats)
+
+    async def aget_page_context(self):
+        return {'title': self.author.name, 'author': self.author, 'stats': await self.aget_author_stats()}
+
+
+class ShowBook(AsyncConditionalGetMixin, views.ShowBook):
+    async def aget_freshness(self):
+        return self.describe_freshness(await aget_object_or_404(self.get_freshness_queryset()))
+
+    async def aget_context_data(self):
+        slug = self.kwargs[self.slug_url_kwarg]
+        self.object, reviews, similar_books = await asyncio.gather(
+            aget_object_or_404(Book.published.select_related('author').prefetch_related('tags'), slug=slug),
+            alist(Review.objects.filter(book__slug=slug, book__status=Book.Status.PUBLISHED).select_related('user')),
+            alist(Book.published.filter(similar_of__book__slug=slug).select_related('author')
+                  .order_by('similar_of__rank')),
+        )
+        return self.get_context_data(reviews=reviews, similar_books=similar_books)
+
+    async def post(self, request, *args, **kwargs):
+        # Reviews are written through the sync upsert, which runs in its own transaction.
+        return await sync_to_async(super().post)(request, *args, **kwargs)
@@ -0,0 +1,165 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Book, BookQuerySet, Genre, Review
+from .pagecache import SIDEBAR, bounded_timeout, purge_pages
+
+CARD_TEMPLATE = 'books/includes/book_card.html'
+CARD_VERSION_KEY = 'book_card_version:{}'
+CARD_KEY = 'book_card:{}:{}'
+CARD_STATS_KEY = 'book_card_stats:{}'
+GENRE_SIDEBAR_KEY = 'genre_sidebar'
+USER_ACTIVITY_KEY = 'user_activity_counts:{}'
+
+
+def get_card_versions(book_ids):
+    """
+    Get the current card version of each book.
+
+    A book without a stored version gets a fresh random one, so fragments
+    rendered before its version was dropped can never be served again.
+
+    Returns:
+        dict: Book id to version.
+    """
+    keys = {book_id: CARD_VERSION_KEY.format(book_id) for book_id in book_ids}
+    stored = cache.get_many(keys.values())
+    versions, missing = {}, {}
+    for book_id, key in keys.items():
+        versions[book_id] = stored.get(key)
+        if versions[book_id] is None:
+            versions[book_id] = missing[key] = uuid4().hex
+    if missing:
+        cache.set_many(missing, timeout=None)
+    return versions
+
+
+def bump_card_versions(book_ids):
+    """Invalidate the cached cards of the given books."""
+    cache.delete_many([CARD_VERSION_KEY.format(book_id) for book_id in book_ids])
+
+
+def render_book_cards(books):
+    """
+    Render the listing card of each book, reusing cached fragments.
+
+    Only the books whose card is not cached are run through the listing
+    prefetch plan and rendered.
+
+    Returns:
+        list: The card HTML of each book, in order.
+    """
+    versions = get_card_versions([book.pk for book in books])
+    keys = {book.pk: CARD_KEY.format(book.pk, versions[book.pk]) for book in books}
+    cards = cache.get_many(keys.values())
+
+    misses = [book for book in books if keys[book.pk] not in cards]
+    if misses:
+        prefetch_related_objects(misses, *BookQuerySet.listing_prefetches())
+        rendered = {keys[book.pk]: render_to_string(CARD_TEMPLATE, {'book': book}) for book in misses}
+        cache.set_many(rendered, timeout=bounded_timeout(settings.BOOK_CARD_CACHE_TIMEOUT))
+        cards.update(rendered)
+
+    count_card_lookups(hits=len(books) - len(misses), misses=len(misses))
+    return [mark_safe(cards[keys[book.pk]]) for book in books]
+
+
+def count_card_lookups(hits=0, misses=0):
+    """Add to the hit/miss counters of the card cache, kept in the cache of the process unless it is shared."""
+    for name, value in (('hits', hits), ('misses', misses)):
+        if value:
+            key = CARD_STATS_KEY.format(name)
+            cache.add(key, 0, timeout=None)
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                cache.set(key, value, timeout=None)
+
+
+def get_card_stats():
+    """
+    Get the hit/miss counters of the card cache.
+
+    Returns:
+        dict: The hits, misses and hit ratio.
+    """
+    stats = cache.get_many([CARD_STATS_KEY.format('hits'), CARD_STATS_KEY.format('misses')])
+    hits = stats.get(CARD_STATS_KEY.format('hits'), 0)
+    misses = stats.get(CARD_STATS_KEY.format('misses'), 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'ratio': hits / total if total else 0.0}
+
+
+def reset_card_stats():
+    cache.delete_many([CARD_STATS_KEY.format('hits'), CARD_STATS_KEY.format('misses')])
+
+
+def _get_genre_sidebar():
+    sidebar = cache.get(GENRE_SIDEBAR_KEY)
+    if sidebar is None:
+        genres = [
+            {'pk': genre.pk, 'title': genre.title, 'url': genre.get_absolute_url(), 'book_count': genre.book_count}
+            for genre in Genre.objects.annotate(
+                book_count=Count('books', filter=Q(books__status=Book.Status.PUBLISHED)))
+        ]
+        sidebar = {'version': uuid4().hex, 'genres': genres}
+        cache.set(GENRE_SIDEBAR_KEY, sidebar, timeout=bounded_timeout(settings.GENRE_SIDEBAR_CACHE_TIMEOUT))
+    return sidebar
+
+
+def get_genre_sidebar():
+    """
+    Get the genres of the sidebar with the number of published books in each.
+
+    The list is computed with one aggregate query and then served from the
+    cache until a genre, a book's status or a book's genres change, or for
+    at most GENRE_SIDEBAR_CACHE_TIMEOUT seconds.
+
+    Returns:
+        list: A dict with pk, title, url and book_count per genre.
+    """
+    return _get_genre_sidebar()['genres']
+
+
+def get_genre_sidebar_version():
+    """
+    Get a token that changes whenever the sidebar data changes.
+
+    Returns:
+        str: The version.
+    """
+    return _get_genre_sidebar()['version']
+
+
+def invalidate_genre_sidebar():
+    cache.delete(GENRE_SIDEBAR_KEY)
+    purge_pages([SIDEBAR])
+
+
+def get_user_activity_counts(user_id):
+    """
+    Get the number of published books a user added and of reviews they wrote.
+
+    The counts are served from the cache until one of them changes.
+
+    Returns:
+        dict: The ``books`` and ``reviews`` counts.
+    """
+    key = USER_ACTIVITY_KEY.format(user_id)
+    counts = cache.get(key)
+    if counts is None:
+        counts = {
+            'books': Book.published.filter(user_id=user_id).count(),
+            'reviews': Review.objects.filter(user_id=user_id).count(),
+        }
+        cache.set(key, counts, timeout=bounded_timeout(settings.USER_ACTIVITY_CACHE_TIMEOUT))
+    return counts
+
+
+def invalidate_user_activity_counts(user_ids):
+    cache.delete_many([USER_ACTIVITY_KEY.format(user_id) for user_id in user_ids if user_id is not None])
@@ -1,5 +1,8 @@
+from bookworm.metrics import timed
+
 from .utils import menu
 
 
+@timed('books_context')
 def get_books_context(request):
     return {'mainmenu': menu}
@@ -1,6 +1,7 @@
 from django import forms
 
 from .models import Book, Review
+from .widgets import AutocompleteSelect, AutocompleteSelectMultiple, TagAutocompleteInput
 
 
 class AddBookForm(forms.ModelForm):
@@ -9,12 +10,12 @@ class AddBookForm(forms.ModelForm):
         fields = ['title', 'author', 'genre', 'first_published', 'description', 'quote', 'image', 'tags', 'slug']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'w3-input'}),
-            'author': forms.Select(attrs={'class': 'w3-select w3-border'}),
-            'genre': forms.SelectMultiple(attrs={'cols': 50}),
+            'author': AutocompleteSelect('api:autocomplete_authors', attrs={'class': 'w3-select w3-border'}),
+            'genre': AutocompleteSelectMultiple('api:autocomplete_genres', attrs={'class': 'w3-select w3-border'}),
             'first_published': forms.TextInput(attrs={'class': 'w3-input'}),
             'description': forms.Textarea(attrs={'class': 'w3-input', 'cols': 50, 'rows': 5, 'style': 'resize:none;'}),
             'quote': forms.Textarea(attrs={'class': 'w3-input', 'cols': 50, 'rows': 5, 'style': 'resize:none;'}),
-            'tags': forms.TextInput(attrs={'class': 'w3-input'}),
+            'tags': TagAutocompleteInput('api:autocomplete_tags', attrs={'class': 'w3-input'}),
             'slug': forms.TextInput(attrs={'class': 'w3-input'}),
         }
 
@@ -0,0 +1,156 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.html import format_html, format_html_join
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'renditions'
+# File extension, Pillow format and save options of each rendition format, best first.
+RENDITION_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+
+_executor = ThreadPoolExecutor(max_workers=settings.IMAGE_RENDITION_WORKERS, thread_name_prefix='renditions')
+
+
+def rendition_name(name, width, ext):
+    """
+    Get the storage name of one rendition of an image.
+
+    Example: 'images/dune.jpg' at 250px as WebP is 'renditions/images/dune_250w.webp'.
+
+    Returns:
+        str: The storage name.
+    """
+    stem = posixpath.splitext(name)[0]
+    return f'{RENDITIONS_DIR}/{stem}_{width}w.{ext}'
+
+
+def rendition_names(name):
+    """Yield the storage name of every rendition of an image."""
+    for width in settings.IMAGE_RENDITION_WIDTHS:
+        for ext, fmt, options in RENDITION_FORMATS:
+            yield rendition_name(name, width, ext)
+
+
+def generate_renditions(name, storage=default_storage, force=False):
+    """
+    Write every rendition of a stored image.
+
+    Images are never upscaled: widths above the original width are
+    rendered at the original width.
+
+    Returns:
+        int: The number of files written.
+    """
+    try:
+        with storage.open(name, 'rb') as f:
+            original = ImageOps.exif_transpose(Image.open(f))
+            original.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning('Cannot read image %s', name)
+        return 0
+
+    written = 0
+    for width in settings.IMAGE_RENDITION_WIDTHS:
+        resized = None
+        for ext, fmt, options in RENDITION_FORMATS:
+            target = rendition_name(name, width, ext)
+            if not force and storage.exists(target):
+                continue
+            if resized is None:
+                size = min(width, original.width)
+                has_alpha = 'A' in original.getbands() or 'transparency' in original.info
+                resized = original.convert('RGBA' if has_alpha else 'RGB')
+                resized = resized.resize((size, max(1, round(original.height * size / original.width))), Image.LANCZOS)
+            image = resized
+            if fmt == 'JPEG' and resized.mode == 'RGBA':
+                image = Image.new('RGB', resized.size, 'white')
+                image.paste(resized, mask=resized.getchannel('A'))
+            buffer = BytesIO()
+            image.save(buffer, fmt, **options)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+            written += 1
+    return written
+
+
+def schedule_renditions(fieldfile, on_done=None):
+    """
+    Generate the renditions of an image on the worker pool once the current
+    transaction commits. Does nothing if they already exist.
+
+    ``on_done`` is called from the worker after the files are written, e.g.
+    to drop cached HTML that still points at the original.
+    """
+    if not fieldfile or has_renditions(fieldfile.name, fieldfile.storage):
+        return
+    name, storage = fieldfile.name, fieldfile.storage
+    transaction.on_commit(lambda: _executor.submit(_generate_logged, name, storage, on_done))
+
+
+def _generate_logged(name, storage, on_done):
+    try:
+        generate_renditions(name, storage)
+        if on_done:
+            on_done()
+    except Exception:
+        logger.exception('Cannot generate renditions of %s', name)
+
+
+def has_renditions(name, storage=default_storage):
+    widths = settings.IMAGE_RENDITION_WIDTHS
+    return storage.exists(rendition_name(name, widths[-1], RENDITION_FORMATS[-1][0]))
+
+
+def rendition_url(fieldfile, width):
+    """
+    Get the URL of the JPEG rendition closest to (and not below) a width.
+
+    Falls back to the original while the renditions are not generated yet.
+
+    Returns:
+        str: The URL.
+    """
+    if not has_renditions(fieldfile.name, fieldfile.storage):
+        return fieldfile.url
+    widths = settings.IMAGE_RENDITION_WIDTHS
+    width = next((w for w in widths if w >= width), widths[-1])
+    return fieldfile.storage.url(rendition_name(fieldfile.name, width, RENDITION_FORMATS[-1][0]))
+
+
+def responsive_image_html(fieldfile, sizes, **attrs):
+    """
+    Render a <picture> with a WebP srcset and a JPEG fallback srcset.
+
+    Falls back to a plain <img> of the original while the renditions are
+    not generated yet.
+
+    Returns:
+        SafeString: The HTML.
+    """
+    attributes = format_html_join('', ' {}="{}"', ((key.replace('_', '-'), value) for key, value in attrs.items()))
+    if not has_renditions(fieldfile.name, fieldfile.storage):
+        return format_html('<img src="{}"{}>', fieldfile.url, attributes)
+
+    storage, widths = fieldfile.storage, settings.IMAGE_RENDITION_WIDTHS
+
+    def srcset(ext):
+        return ', '.join(f'{storage.url(rendition_name(fieldfile.name, w, ext))} {w}w' for w in widths)
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        srcset('webp'), sizes,
+        storage.url(rendition_name(fieldfile.name, widths[0], 'jpg')), srcset('jpg'), sizes, attributes,
+    )
@@ -0,0 +1,257 @@
+import json
+import math
+import statistics
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Q
+from django.shortcuts import resolve_url
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import NoReverseMatch, resolve, reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from taggit.models import Tag
+
+import books.urls
+import users.urls
+from books.models import Author, Book, Genre, Review
+from bookworm.ratelimit import RateLimitMiddleware
+
+# Routes that change state on GET, so benchmarking them would break the run.
+SKIPPED_ROUTES = {'users:logout'}
+# Extra query strings for routes that need one to do any work.
+QUERY_STRINGS = {'search': 'q=the'}
+# Calls of the rate limiter per measurement, as one takes microseconds.
+RATELIMIT_ITERATIONS = 10000
+RATELIMIT_STORES = ('bookworm.ratelimit.LocalBucketStore', 'bookworm.ratelimit.CacheBucketStore')
+
+
+def percentile(values, fraction):
+    """
+    Get a percentile with the nearest-rank method.
+
+    Returns:
+        float: The smallest value that at least ``fraction`` of the values do not exceed.
+    """
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def bench_host():
+    """
+    Get the host to send the requests to: an allowed one, or every request
+    would be rejected with a 400 and its timings would be the error page's.
+
+    Returns:
+        str: The host name.
+    """
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    # Allowed when DEBUG is on and ALLOWED_HOSTS is empty, and by '*'.
+    return 'localhost'
+
+
+def is_success(status_code):
+    return 200 <= status_code < 400
+
+
+def iter_routes():
+    """Yield the name and route of every named URL pattern of the books and users apps."""
+    for module, namespace in ((books.urls, None), (users.urls, users.urls.app_name)):
+        for pattern in module.urlpatterns:
+            if pattern.name:
+                yield f'{namespace}:{pattern.name}' if namespace else pattern.name, pattern.pattern
+
+
+def sample_kwargs(user):
+    """
+    Pick the URL arguments to benchmark with: the busiest book, genre, tag
+    and author, and the given user.
+
+    Returns:
+        dict: URL keyword argument name to value.
+    """
+    published = Q(books__status=Book.Status.PUBLISHED)
+    samples = {
+        'book_slug': Book.published.order_by('-reviews_count', 'pk').values_list('slug', flat=True).first(),
+        'genre_slug': (Genre.objects.annotate(n=Count('books', filter=published)).order_by('-n', 'pk')
+                       .values_list('slug', flat=True).first()),
+        'author_slug': (Author.objects.annotate(n=Count('books', filter=published)).order_by('-n', 'pk')
+                        .values_list('slug', flat=True).first()),
+        'tag': (Tag.objects.annotate(n=Count('taggit_taggeditem_items')).order_by('-n', 'pk')
+                .values_list('slug', flat=True).first()),
+        'pk': user.pk,
+        'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+        'token': default_token_generator.make_token(user),
+    }
+    return {name: value for name, value in samples.items() if value is not None}
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every page of the books and users apps through the test client and report the p50/p95/p99 '
+            'latency, database queries and response size of each. Pages that need a login are requested as '
+            '--user. Results can be saved as JSON and compared with an earlier run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Measured requests per route.')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per route first.')
+        parser.add_argument('--route', action='append', dest='routes', help='Only benchmark this route name; '
+                                                                            'repeat for several.')
+        parser.add_argument('--user', help='Username for the pages that need a login; defaults to the first user.')
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every request.')
+        parser.add_argument('--output', help='Save the results to this JSON file.')
+        parser.add_argument('--compare', help='Compare with the results saved in this JSON file.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['warmup'] < 0:
+            raise CommandError('--iterations must be positive and --warmup not negative.')
+        User = get_user_model()
+        users = User.objects.order_by('pk')
+        user = users.filter(username=options['user']).first() if options['user'] else users.first()
+        if user is None:
+            raise CommandError('A user is needed for the pages that need a login.')
+
+        host = bench_host()
+        self.anonymous = Client(HTTP_HOST=host)
+        self.logged_in = Client(HTTP_HOST=host)
+        self.logged_in.force_login(user)
+        kwargs = sample_kwargs(user)
+
+        results = []
+        for name, route in iter_routes():
+            if name in SKIPPED_ROUTES or (options['routes'] and name not in options['routes']):
+                continue
+            try:
+                url = reverse(name, kwargs={key: kwargs[key] for key in route.converters} or None)
+            except (KeyError, NoReverseMatch):
+                self.stderr.write(f'{name}: skipped, no sample arguments')
+                continue
+            if name in QUERY_STRINGS:
+                url = f'{url}?{QUERY_STRINGS[name]}'
+            results.append(self.bench_route(name, url, options))
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'iterations': options['iterations'],
+            'cold': options['cold'],
+            'catalog': {'books': Book.objects.count(), 'reviews': Review.objects.count(), 'users': users.count()},
+            'routes': results,
+            'ratelimit_us': self.bench_rate_limits(user, kwargs['book_slug']),
+        }
+        self.print_report(report, self.load(options['compare']) if options['compare'] else None)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Saved the results to {options['output']}")
+        failed = [f"{result['route']} ({result['status']})" for result in results if not is_success(result['status'])]
+        if failed:
+            raise CommandError(f"These routes answered with an error, so their timings are not meaningful: "
+                               f"{', '.join(failed)}")
+
+    def request(self, client, url, cold):
+        if cold:
+            cache.clear()
+        with ExitStack() as stack:
+            captures = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in settings.DATABASES]
+            started = time.perf_counter()
+            response = client.get(url)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            elapsed = time.perf_counter() - started
+        return response, elapsed, sum(len(capture) for capture in captures), len(content)
+
+    def bench_route(self, name, url, options):
+        client = self.anonymous
+        response = self.request(client, url, options['cold'])[0]
+        if response.status_code == 302 and response['Location'].startswith(resolve_url(settings.LOGIN_URL)):
+            client = self.logged_in
+        for _ in range(options['warmup']):
+            self.request(client, url, options['cold'])
+
+        timings, queries, errors = [], [], []
+        for _ in range(options['iterations']):
+            response, elapsed, query_count, size = self.request(client, url, options['cold'])
+            timings.append(elapsed * 1000)
+            queries.append(query_count)
+            if not is_success(response.status_code):
+                errors.append(response.status_code)
+        return {
+            'route': name,
+            'url': url,
+            'logged_in': client is self.logged_in,
+            # An error in any measured request makes the route's numbers those of an error page.
+            'status': errors[0] if errors else response.status_code,
+            'p50_ms': round(percentile(timings, 0.50), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'queries': max(queries),
+            'bytes': size,
+        }
+
+    @staticmethod
+    def bench_rate_limits(user, book_slug):
+        """
+        Measure what RateLimitMiddleware adds to a request: to one of a route
+        without limits, and to a logged-in POST of a limited route with each
+        bucket store. The limits are raised so that no request is refused.
+
+        Returns:
+            dict: Case to mean microseconds per request.
+        """
+        middleware = RateLimitMiddleware(lambda request: None)
+        factory = RequestFactory()
+        unlimited = factory.get(reverse('home'))
+        limited_url = reverse('book', kwargs={'book_slug': book_slug})
+        limited = factory.post(limited_url)
+        for request in (unlimited, limited):
+            request.resolver_match = resolve(request.path_info)
+            request.user = user
+
+        def measure(request):
+            middleware.process_view(request, None, (), {})
+            started = time.perf_counter()
+            for _ in range(RATELIMIT_ITERATIONS):
+                middleware.process_view(request, None, (), {})
+            return round((time.perf_counter() - started) / RATELIMIT_ITERATIONS * 1e6, 2)
+
+        results = {'unlimited route': measure(unlimited)}
+        limits = {'book': {'ip': f'{RATELIMIT_ITERATIONS * 10}/s', 'user': f'{RATELIMIT_ITERATIONS * 10}/s'}}
+        for store in RATELIMIT_STORES:
+            with override_settings(RATELIMITS=limits, RATELIMIT_STORE=store):
+                results[f"limited route ({store.rsplit('.', 1)[1]})"] = measure(limited)
+        return results
+
+    @staticmethod
+    def load(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return {result['route']: result for result in json.load(f)['routes']}
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+
+    def print_report(self, report, previous):
+        catalog = report['catalog']
+        self.stdout.write(f"{catalog['books']} books, {catalog['reviews']} reviews, {catalog['users']} users; "
+                          f"{report['iterations']} requests per route{' with a cold cache' if report['cold'] else ''}")
+        self.stdout.write(f"{'route':<28} {'status':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+                          f"{'queries':>7} {'bytes':>9}")
+        for result in report['routes']:
+            line = (f"{result['route']:<28} {result['status']:>6} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                    f"{result['p99_ms']:>9.2f} {result['queries']:>7} {result['bytes']:>9}")
+            before = previous.get(result['route']) if previous else None
+            if before:
+                change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] if before['p50_ms'] else 0
+                line += f"   p50 {change:+.0%}, queries {result['queries'] - before['queries']:+d}"
+            self.stdout.write(line)
+        self.stdout.write('Rate limiting overhead per request: ' + ', '.join(
+            f'{case} {microseconds:.2f} us' for case, microseconds in report.get('ratelimit_us', {}).items()
+        ))
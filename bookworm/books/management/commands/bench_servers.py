@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.urls import reverse
+
+from books.models import Book, Genre
+
+from .bench import percentile
+
+HOST = '127.0.0.1'
+
+
+def default_urls():
+    """Get one URL of each read-only page, picked from the current database."""
+    book = Book.published.select_related('author').order_by('-reviews_count').first()
+    if book is None:
+        raise CommandError('There are no published books to request.')
+    urls = [reverse('home'), reverse('home') + '?page=2', book.get_absolute_url(), book.author.get_absolute_url()]
+    genre = Genre.objects.filter(books__status=Book.Status.PUBLISHED).first()
+    if genre is not None:
+        urls.append(genre.get_absolute_url())
+    tag = book.tags.first()
+    if tag is not None:
+        urls.append(reverse('books_by_tags', args=[tag.slug]))
+    user = get_user_model().objects.order_by('pk').first()
+    if user is not None:
+        urls.append(reverse('users:profile', args=[user.pk]))
+    return urls
+
+
+def run_wsgi(urls, total, concurrency):
+    """
+    Request the URLs from the WSGI handler on a pool of threads, the way a
+    threaded WSGI server would.
+
+    The URLs are requested once first to warm up the caches.
+
+    Returns:
+        tuple: The status code and latency in seconds of each request, and
+        the total time in seconds.
+    """
+    application = get_wsgi_application()
+
+    def request(url):
+        parts = urlsplit(url)
+        environ = {'PATH_INFO': parts.path, 'QUERY_STRING': parts.query, 'HTTP_HOST': HOST, 'SERVER_NAME': HOST}
+        setup_testing_defaults(environ)
+        statuses = []
+        started = time.perf_counter()
+        response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            b''.join(response)
+        finally:
+            response.close()
+        return int(statuses[0].split()[0]), time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(request, urls))
+        started = time.perf_counter()
+        results = list(executor.map(request, islice(cycle(urls), total)))
+        return results, time.perf_counter() - started
+
+
+def run_asgi(urls, total, concurrency):
+    """
+    Request the URLs from the ASGI handler with concurrent tasks on one
+    event loop, the way an ASGI server would.
+
+    The URLs are requested once first to warm up the caches.
+
+    Returns:
+        tuple: The status code and latency in seconds of each request, and
+        the total time in seconds.
+    """
+    application = get_asgi_application()
+
+    async def request(url):
+        parts = urlsplit(url)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': parts.path, 'raw_path': parts.path.encode(), 'query_string': parts.query.encode(), 'root_path': '',
+            'headers': [(b'host', HOST.encode())], 'client': (HOST, 50000), 'server': (HOST, 80),
+        }
+        done = asyncio.Event()
+        status = None
+
+        async def receive():
+            if done.is_set():
+                return {'type': 'http.disconnect'}
+            done.set()
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        started = time.perf_counter()
+        await application(scope, receive, send)
+        return status, time.perf_counter() - started
+
+    async def worker(queue, results):
+        for url in queue:
+            results.append(await request(url))
+
+    async def run(requested):
+        queue, results = iter(requested), []
+        await asyncio.gather(*(worker(queue, results) for _ in range(concurrency)))
+        return results
+
+    async def main():
+        await run(urls)
+        started = time.perf_counter()
+        results = await run(list(islice(cycle(urls), total)))
+        return results, time.perf_counter() - started
+
+    return asyncio.run(main())
+
+
+def summarize(results, elapsed):
+    latencies = [latency for status, latency in results]
+    return {
+        'requests': len(results),
+        'errors': sum(status >= 400 for status, latency in results),
+        'seconds': round(elapsed, 3),
+        'rps': round(len(results) / elapsed, 1),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Compare the throughput of the read-only pages served through WSGI (sync views on threads) and ASGI '
+            '(async views on an event loop), on the current database. Each mode runs in its own process, '
+            'driving the Django handler directly so that no server or network is measured.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per mode, spread over the URLs.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent requests (threads or tasks).')
+        parser.add_argument('--url', action='append', dest='urls', help='URL to request; repeat for several. '
+                                                                        'Defaults to one URL of each read-only page.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+        parser.add_argument('--mode', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive.')
+        if options['mode']:
+            return self.run_mode(options)
+
+        urls = options['urls'] or default_urls()
+        results = {mode: self.spawn(mode, urls, options) for mode in ('wsgi', 'asgi')}
+        if options['json']:
+            self.stdout.write(json.dumps({'urls': urls, 'concurrency': options['concurrency'], 'results': results}))
+            return
+
+        self.stdout.write(f"{len(urls)} URLs, {options['requests']} requests, concurrency {options['concurrency']}")
+        for mode, stats in results.items():
+            self.stdout.write(f"{mode}: {stats['rps']:8.1f} req/s  mean {stats['mean_ms']:7.2f} ms  "
+                              f"p95 {stats['p95_ms']:7.2f} ms  errors {stats['errors']}")
+        ratio = results['asgi']['rps'] / results['wsgi']['rps']
+        self.stdout.write(self.style.SUCCESS(f'ASGI/WSGI throughput: {ratio:.2f}x'))
+
+    def spawn(self, mode, urls, options):
+        """Run one mode in a fresh process, with the matching views routed."""
+        command = [sys.executable, '-m', 'django', 'bench_servers', '--mode', mode,
+                   '--requests', str(options['requests']), '--concurrency', str(options['concurrency'])]
+        for url in urls:
+            command += ['--url', url]
+        env = dict(os.environ, BOOKWORM_ASYNC_VIEWS='1' if mode == 'asgi' else '0')
+        done = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if done.returncode:
+            raise CommandError(f'The {mode} run failed:\n{done.stderr}')
+        return json.loads(done.stdout.strip().splitlines()[-1])
+
+    def run_mode(self, options):
+        run = run_asgi if options['mode'] == 'asgi' else run_wsgi
+        results, elapsed = run(options['urls'], options['requests'], options['concurrency'])
+        self.stdout.write(json.dumps(summarize(results, elapsed)))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from books.cache import get_card_stats, reset_card_stats
+from books.pagecache import cache_is_shared
+
+
+class Command(BaseCommand):
+    help = ('Show the hit/miss counters of the book card fragment cache. The counters live in the cache, '
+            'so the command needs a cache backend shared with the web workers.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them.')
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            raise CommandError('The default cache is local to each process, so the counters of the web workers '
+                               'cannot be read from here. Configure a shared cache backend in CACHES.')
+        stats = get_card_stats()
+        self.stdout.write(f"hits: {stats['hits']}  misses: {stats['misses']}  hit ratio: {stats['ratio']:.1%}")
+        if options['reset']:
+            reset_card_stats()
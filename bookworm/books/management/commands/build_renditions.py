@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from books.images import generate_renditions
+from books.models import Author, Book
+
+IMAGE_FIELDS = ((Book, 'image'), (Author, 'photo'), (get_user_model(), 'avatar'))
+
+
+class Command(BaseCommand):
+    help = 'Generate the missing resized renditions of book covers, author photos and user avatars.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate renditions that already exist.')
+
+    def handle(self, *args, **options):
+        images = written = 0
+        for model, field_name in IMAGE_FIELDS:
+            storage = model._meta.get_field(field_name).storage
+            names = (model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                     .order_by().values_list(field_name, flat=True).distinct())
+            for name in names.iterator():
+                images += 1
+                written += generate_renditions(name, storage, force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} renditions for {images} images'))
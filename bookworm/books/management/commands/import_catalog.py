@@ -0,0 +1,276 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import slugify
+from taggit.models import Tag, TaggedItem
+from taggit.utils import parse_tags
+
+from books.cache import bump_card_versions, invalidate_genre_sidebar
+from books.models import Author, Book, Genre, TagStat
+from books.search import index_books
+from books.similar import mark_similar_stale
+
+BOOK_FIELDS = ('title', 'author', 'first_published', 'description', 'quote', 'status')
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """Yield the input records one by one, without reading the whole file."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def split_names(value, max_length, make_slug, parse=None):
+    """
+    Get a list of names from a JSON list or a delimited string.
+
+    Strings are split on commas unless a ``parse`` function is given, and
+    blank names are dropped. ``make_slug`` is the function the names are
+    stored with, so that a name it cannot turn into a slug is refused here
+    rather than stored under an empty slug.
+
+    Returns:
+        list: The names, or None if the field is absent.
+
+    Raises:
+        RowError: If a name has no slug.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        names = parse(value) if parse else value.split(',')
+    else:
+        names = value
+    names = {str(name).strip()[:max_length] for name in names} - {''}
+    for name in names:
+        if not make_slug(name):
+            raise RowError(f'cannot make a slug for {name!r}')
+    return list(names)
+
+
+def clean_row(row, default_status):
+    """
+    Validate a raw record and normalise it for import.
+
+    Returns:
+        dict: The book fields, plus 'genres' and 'tags' lists (or None). The
+        status is None if neither the record nor ``default_status`` sets it.
+
+    Raises:
+        RowError: If the record cannot be imported.
+    """
+    title = (row.get('title') or '').strip()
+    author = (row.get('author') or '').strip()
+    if not title or not author:
+        raise RowError('title and author are required')
+    slug = slugify(title)
+    if not slug or not slugify(author):
+        raise RowError(f'cannot make a slug for {title!r} by {author!r}')
+    try:
+        first_published = int(row.get('first_published') or 0)
+    except (TypeError, ValueError):
+        raise RowError(f'invalid first_published {row.get("first_published")!r}')
+    status = (row.get('status') or default_status or '').strip() or None
+    if status is not None and status not in Book.Status.values:
+        raise RowError(f'invalid status {status!r}')
+    return {
+        'slug': slug,
+        'title': title[:255],
+        'author': author[:255],
+        'first_published': first_published,
+        'description': row.get('description') or '',
+        'quote': row.get('quote') or '',
+        'status': status,
+        # Genre and author slugs are ASCII, like the URLs they go in; taggit keeps unicode in tag slugs.
+        'genres': split_names(row.get('genres'), max_length=255, make_slug=slugify),
+        'tags': split_names(row.get('tags'), max_length=100, make_slug=Tag().slugify, parse=parse_tags),
+    }
+
+
+def upsert_by_slug(model, name_field, names):
+    """
+    Create the missing rows of a slugged model in one INSERT, with the
+    casefolded copy of their name that save() would have set.
+
+    Returns:
+        dict: Name to primary key for all the given names.
+    """
+    slugs = {name: slugify(name) for name in names}
+    model.objects.bulk_create(
+        [model(**{name_field: name[:255], f'{name_field}_casefold': name[:255].casefold()[:255], 'slug': slug})
+         for name, slug in slugs.items()],
+        ignore_conflicts=True,
+    )
+    ids = dict(model.objects.filter(slug__in=slugs.values()).values_list('slug', 'pk'))
+    return {name: ids[slug] for name, slug in slugs.items()}
+
+
+def upsert_tags(names):
+    """
+    Create the missing tags in one INSERT.
+
+    Tags whose slug clashes with a differently named tag are created one by
+    one, so that taggit can give them a unique slug.
+
+    Returns:
+        dict: Name to primary key for all the given names.
+    """
+    Tag.objects.bulk_create([Tag(name=name, slug=Tag().slugify(name)) for name in names], ignore_conflicts=True)
+    ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'pk'))
+    for name in set(names) - set(ids):
+        ids[name] = Tag.objects.create(name=name).pk
+    return ids
+
+
+class Command(BaseCommand):
+    help = ('Import books from a CSV or JSONL file in batches, creating or updating authors, genres, tags and books. '
+            'Records have title, author, first_published, description, quote, status, genres and tags; '
+            'a book is matched on the slug of its title.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file, or '-' for standard input.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format; guessed from the file name by default.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--status', choices=Book.Status.values,
+                            help='Status of records that do not set one. Without it, such records create draft '
+                                 'books and leave the status of existing books unchanged.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl' if path != '-' else None)
+        if fmt is None:
+            raise CommandError('Use --format when reading from standard input.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        self.content_type = ContentType.objects.get_for_model(Book)
+        totals = {'rows': 0, 'created': 0, 'updated': 0, 'errors': 0}
+        started = time.monotonic()
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            rows = read_rows(stream, fmt)
+            for number, batch in enumerate(batched(rows, options['batch_size']), start=1):
+                self.import_batch(number, batch, options['status'], totals)
+        except (csv.Error, json.JSONDecodeError) as e:
+            raise CommandError(f'Cannot read {path} after {totals["rows"]} rows: {e}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        rate = totals['rows'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['rows']} rows in {elapsed:.1f}s ({rate:.0f} rows/s): "
+            f"{totals['created']} created, {totals['updated']} updated, {totals['errors']} errors"
+        ))
+
+    def import_batch(self, number, batch, default_status, totals):
+        started = time.monotonic()
+        records, errors = {}, []
+        for row in batch:
+            try:
+                record = clean_row(row, default_status)
+            except RowError as e:
+                errors.append(str(e))
+                continue
+            records[record['slug']] = record
+
+        created = updated = 0
+        if records:
+            try:
+                with transaction.atomic():
+                    created, book_ids = self.write_records(records)
+                    updated = len(records) - created
+                    bump_card_versions(book_ids)
+                    index_books(book_ids)
+                    mark_similar_stale(book_ids)
+                    invalidate_genre_sidebar()
+            except Exception as e:
+                errors.append(f'batch failed, nothing written: {e}')
+                created = updated = 0
+
+        totals['rows'] += len(batch)
+        totals['created'] += created
+        totals['updated'] += updated
+        totals['errors'] += len(errors)
+        rate = len(batch) / (time.monotonic() - started or 1e-9)
+        self.stdout.write(f'batch {number}: {len(batch)} rows, {created} created, {updated} updated, '
+                          f'{len(errors)} errors ({rate:.0f} rows/s)')
+        for error in errors:
+            self.stderr.write(f'  batch {number}: {error}')
+
+    def write_records(self, records):
+        """
+        Upsert one batch of cleaned records.
+
+        Returns:
+            tuple: The number of new books and the ids of all books in the batch.
+        """
+        authors = upsert_by_slug(Author, 'name', {r['author'] for r in records.values()})
+        genre_names = {name for r in records.values() for name in r['genres'] or ()}
+        genres = upsert_by_slug(Genre, 'title', genre_names) if genre_names else {}
+        tag_names = {name for r in records.values() for name in r['tags'] or ()}
+        tags = upsert_tags(tag_names) if tag_names else {}
+
+        existing = set(Book.objects.filter(slug__in=records).values_list('slug', flat=True))
+        # Books may lose tags or their published status; their old tags need recounting too.
+        old_tag_ids = Book.objects.filter(slug__in=existing).tag_ids() if existing else set()
+        # Records without a status create drafts, but must not unpublish the books they update.
+        for with_status in (True, False):
+            books = [
+                Book(author_id=authors[r['author']], **{f: r[f] for f in BOOK_FIELDS if f not in ('author', 'status')},
+                     status=r['status'] or Book.Status.DRAFT, slug=slug)
+                for slug, r in records.items() if (r['status'] is not None) == with_status
+            ]
+            if books:
+                Book.objects.bulk_create(
+                    books,
+                    update_conflicts=True,
+                    unique_fields=['slug'],
+                    update_fields=[f for f in BOOK_FIELDS if with_status or f != 'status'] + ['time_update'],
+                )
+        book_ids = dict(Book.objects.filter(slug__in=records).values_list('slug', 'pk'))
+
+        with_genres = {book_ids[slug]: r['genres'] for slug, r in records.items() if r['genres'] is not None}
+        if with_genres:
+            through = Book.genre.through
+            through.objects.filter(book_id__in=with_genres).delete()
+            through.objects.bulk_create(
+                [through(book_id=book_id, genre_id=genres[name])
+                 for book_id, names in with_genres.items() for name in set(names)],
+                ignore_conflicts=True,
+            )
+
+        with_tags = {book_ids[slug]: r['tags'] for slug, r in records.items() if r['tags'] is not None}
+        if with_tags:
+            TaggedItem.objects.filter(content_type=self.content_type, object_id__in=with_tags).delete()
+            TaggedItem.objects.bulk_create(
+                [TaggedItem(content_type=self.content_type, object_id=book_id, tag_id=tags[name])
+                 for book_id, names in with_tags.items() for name in set(names)],
+                ignore_conflicts=True,
+            )
+
+        TagStat.objects.refresh(old_tag_ids | Book.objects.filter(pk__in=book_ids.values()).tag_ids())
+        return len(records) - len(existing), list(book_ids.values())
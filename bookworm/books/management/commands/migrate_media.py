@@ -0,0 +1,179 @@
+import posixpath
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from books.cache import bump_card_versions
+from books.images import RENDITIONS_DIR, rendition_names
+from books.models import Book
+from books.pagecache import SIDEBAR, purge_pages
+from bookworm.storage import ContentAddressedStorage, is_content_addressed
+from users.authentication import invalidate_cached_user
+
+from .build_renditions import IMAGE_FIELDS
+
+
+def walk(storage, directory):
+    """Yield the name of every file under a storage directory."""
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from walk(storage, posixpath.join(directory, name))
+
+
+def is_moved(storage, name):
+    """Check whether a file's content is also stored under its content-addressed name."""
+    with storage.open(name, 'rb') as f:
+        return storage.exists(storage.hashed_name(name, f))
+
+
+class Command(BaseCommand):
+    help = ('Move the book covers, author photos and user avatars stored under their upload names to their '
+            'content-addressed names, storing identical files once, and with --gc delete the content-addressed '
+            'files and moved originals of their directories that no row refers to.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gc', action='store_true',
+                            help='Then delete the content-addressed files and moved originals no row refers to.')
+        parser.add_argument('--min-age', type=float, default=24,
+                            help='Only delete files older than this many hours, as uploads are stored before '
+                                 'their row is saved.')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be done without doing it.')
+
+    def handle(self, *args, **options):
+        if options['min_age'] < 0:
+            raise CommandError('--min-age must not be negative.')
+        for model, field_name in IMAGE_FIELDS:
+            if not isinstance(model._meta.get_field(field_name).storage, ContentAddressedStorage):
+                raise CommandError(f'{model.__name__}.{field_name} does not use ContentAddressedStorage.')
+
+        moved = duplicates = rows = 0
+        for model, field_name in IMAGE_FIELDS:
+            field = model._meta.get_field(field_name)
+            names = (model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                     .order_by().values_list(field_name, flat=True).distinct())
+            for name in [name for name in names if not is_content_addressed(name)]:
+                result = self.move(name, field, options['dry_run'])
+                if result is None:
+                    continue
+                new_name, duplicate = result
+                moved += 1
+                duplicates += duplicate
+                rows += self.rename(model, field_name, name, new_name, options['dry_run'])
+        if rows and not options['dry_run']:
+            # Every cached page has the sidebar; the whole page cache may point at the old names.
+            purge_pages([SIDEBAR])
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {moved} files ({duplicates} duplicates of stored ones), referenced by {rows} rows'
+        ))
+
+        if options['gc']:
+            deleted = self.collect(options['min_age'], options['dry_run'])
+            verb = 'Would delete' if options['dry_run'] else 'Deleted'
+            self.stdout.write(self.style.SUCCESS(f'{verb} {deleted} unreferenced files'))
+
+    def move(self, name, field, dry_run):
+        """
+        Store a file under its content-addressed name, along with its
+        renditions. The original is left for --gc to delete, since rows may
+        be added that refer to it meanwhile.
+
+        Returns:
+            tuple: The new name, and whether it was already stored; or None
+            if the file is missing.
+        """
+        storage = field.storage
+        try:
+            with storage.open(name, 'rb') as f:
+                new_name = storage.hashed_name(name, f)
+                duplicate = storage.exists(new_name)
+                if len(new_name) > field.max_length:
+                    self.stderr.write(f'{name}: skipped, {new_name} is longer than {field.max_length} characters')
+                    return None
+                if not dry_run and not duplicate:
+                    storage.save(new_name, f)
+        except FileNotFoundError:
+            self.stderr.write(f'{name}: skipped, the file is missing')
+            return None
+        if not dry_run:
+            for old, new in zip(rendition_names(name), rendition_names(new_name)):
+                if storage.exists(old) and not storage.exists(new):
+                    with storage.open(old, 'rb') as f:
+                        storage.save(new, f)
+        return new_name, duplicate
+
+    @staticmethod
+    def rename(model, field_name, name, new_name, dry_run):
+        """
+        Point the rows that refer to a file at its new name, and drop what
+        was cached with the old one.
+
+        Returns:
+            int: The number of rows.
+        """
+        ids = list(model.objects.filter(**{field_name: name}).values_list('pk', flat=True))
+        if dry_run or not ids:
+            return len(ids)
+        updates = {field_name: new_name}
+        if any(field.name == 'time_update' for field in model._meta.fields):
+            # Changes the ETags of the pages that show the file.
+            updates['time_update'] = timezone.now()
+        model.objects.filter(pk__in=ids).update(**updates)
+        if model is Book:
+            bump_card_versions(ids)
+        elif model is get_user_model():
+            for user_id in ids:
+                invalidate_cached_user(user_id)
+        return len(ids)
+
+    @staticmethod
+    def collect(min_age, dry_run):
+        """
+        Delete the files, and renditions, of the image fields' directories
+        that no row refers to and that are older than ``min_age`` hours.
+
+        Only content-addressed files, and originals whose content is stored
+        under its content-addressed name, are deleted: the other files of
+        these directories, like the default avatar, may be used without any
+        row referring to them.
+
+        Returns:
+            int: The number of files deleted.
+        """
+        cutoff = timezone.now() - timedelta(hours=min_age)
+        deleted = 0
+        for storage in {model._meta.get_field(field_name).storage for model, field_name in IMAGE_FIELDS}:
+            referenced, directories = set(), set()
+            for model, field_name in IMAGE_FIELDS:
+                field = model._meta.get_field(field_name)
+                if field.storage is not storage:
+                    continue
+                directory = str(field.upload_to).rstrip('/')
+                directories |= {directory, f'{RENDITIONS_DIR}/{directory}'}
+                names = (model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                         .order_by().values_list(field_name, flat=True).distinct())
+                for name in names.iterator():
+                    referenced.add(name)
+                    referenced.update(rendition_names(name))
+            for directory in sorted(directories):
+                for name in walk(storage, directory):
+                    if name in referenced or storage.get_modified_time(name) > cutoff:
+                        continue
+                    if is_content_addressed(name):
+                        garbage = [name]
+                    elif is_moved(storage, name):
+                        renditions = [r for r in rendition_names(name) if r not in referenced and storage.exists(r)]
+                        garbage = [name] + renditions
+                    else:
+                        continue
+                    if not dry_run:
+                        for garbage_name in garbage:
+                            storage.delete(garbage_name)
+                    deleted += len(garbage)
+        return deleted
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored rating aggregates of every book from its reviews.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = Book.objects.update_rating_aggregates()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {count} books'))
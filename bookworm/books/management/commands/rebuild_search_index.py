@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from books.search import rebuild_index, search_available
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of the published books from scratch.'
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError('The full-text search index needs an SQLite database with FTS5.')
+        with transaction.atomic():
+            count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} books'))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.similar import TOP_K, refresh_similar_books, stale_book_ids
+
+
+class Command(BaseCommand):
+    help = ('Compute the similar books shown on the book pages from shared genres, tags and reviewers. '
+            'With --stale, only the books whose inputs changed since the last run are refreshed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale', action='store_true', help='Only refresh the books marked as out of date.')
+        parser.add_argument('--top', type=int, default=TOP_K, help='Similar books to keep per book.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['top'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--top and --batch-size must be positive.')
+        started = time.monotonic()
+        book_ids = None
+        if options['stale']:
+            book_ids = stale_book_ids()
+            if not book_ids:
+                self.stdout.write('No books are out of date')
+                return
+        count = refresh_similar_books(
+            book_ids, k=options['top'], batch_size=options['batch_size'],
+            on_batch=lambda done: self.stdout.write(f'{done} books done'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed the similar books of {count} books in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,227 @@
+import random
+import time
+from io import BytesIO
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import slugify
+from PIL import Image, ImageDraw
+from taggit.models import TaggedItem
+
+from books.cache import bump_card_versions, invalidate_genre_sidebar
+from books.images import generate_renditions
+from books.models import Author, Book, Genre, Review, TagStat
+from books.search import index_books
+
+from .import_catalog import batched, upsert_by_slug, upsert_tags
+
+GENRES = (
+    'Fiction', 'Classics', 'Fantasy', 'Science Fiction', 'Mystery', 'Thriller', 'Romance', 'Historical Fiction',
+    'Horror', 'Biography', 'Memoir', 'History', 'Science', 'Philosophy', 'Poetry', 'Drama', 'Young Adult',
+    'Children', 'Travel', 'Humor', 'Graphic Novels', 'Self Help',
+)
+ADJECTIVES = (
+    'Silent', 'Hidden', 'Broken', 'Golden', 'Last', 'Distant', 'Burning', 'Quiet', 'Lost', 'Crimson', 'Endless',
+    'Forgotten', 'Wild', 'Secret', 'Winter', 'Bright', 'Hollow', 'Midnight', 'Northern', 'Paper',
+)
+NOUNS = (
+    'River', 'House', 'Garden', 'Kingdom', 'Letters', 'Voyage', 'Orchard', 'Mirror', 'Harbor', 'Empire', 'Song',
+    'Island', 'Library', 'Forest', 'Station', 'Daughter', 'Machine', 'Sea', 'Crown', 'Road', 'Archive', 'Storm',
+)
+FIRST_NAMES = (
+    'Anna', 'Boris', 'Clara', 'Daniel', 'Elena', 'Felix', 'Greta', 'Hugo', 'Irina', 'Jonas', 'Karen', 'Leo', 'Maya',
+    'Nikolai', 'Olga', 'Pavel', 'Rosa', 'Simon', 'Tatiana', 'Victor', 'Wanda', 'Yuri', 'Zoe',
+)
+LAST_NAMES = (
+    'Adler', 'Berg', 'Carver', 'Dahl', 'Ellis', 'Fischer', 'Grant', 'Holm', 'Ivanova', 'Jensen', 'Kowalski', 'Lind',
+    'Moreau', 'Novak', 'Orlov', 'Petrov', 'Quinn', 'Rossi', 'Sokolova', 'Tanaka', 'Ueda', 'Voss', 'Weber',
+)
+WORDS = (
+    'story', 'journey', 'family', 'war', 'love', 'memory', 'city', 'secret', 'friendship', 'power', 'truth', 'time',
+    'village', 'letter', 'summer', 'night', 'ocean', 'revolution', 'childhood', 'music', 'silence', 'exile', 'dream',
+    'heir', 'mountain', 'stranger', 'promise', 'betrayal', 'winter', 'garden', 'voyage', 'kingdom', 'machine',
+)
+TAG_COUNT = 200
+COVER_COUNT = 40
+# Weights of the ratings 1 to 5; readers mostly review books they liked.
+RATING_WEIGHTS = (5, 8, 17, 35, 35)
+
+
+def skewed_count(rng, mean, cap):
+    """
+    Draw a count with a long tail: most books get a few reviews, a handful
+    get many. The draws average about ``mean`` before capping.
+    """
+    if mean <= 0:
+        return 0
+    return min(cap, int(rng.paretovariate(1.5) * mean / 3))
+
+
+def zipf_weights(count, exponent=1.0):
+    """
+    Get cumulative weights for random.choices() where the item at rank r is
+    picked in proportion to 1 / r ** exponent, like the popularity of real
+    authors, genres and tags.
+    """
+    weights, total = [], 0
+    for rank in range(1, count + 1):
+        total += 1 / rank ** exponent
+        weights.append(total)
+    return weights
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def make_cover(rng, number):
+    """
+    Draw a plain JPEG cover.
+
+    Returns:
+        ContentFile: The image.
+    """
+    image = Image.new('RGB', (600, 900), tuple(rng.randrange(40, 220) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((60, 300, 540, 600), outline='white', width=8)
+    draw.text((90, 430), f'Cover {number}', fill='white')
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return ContentFile(buffer.getvalue())
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic catalog for development and benchmarks: users, authors, genres, tags, books and '
+            'reviews with realistic skew (a few prolific authors, popular genres and tags, and long-tailed review '
+            'counts). Every run adds new rows; use --seed for a repeatable catalog.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--reviews-per-book', type=float, default=5, help='Average number of reviews per book.')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--published', type=float, default=0.9, help='Share of published books.')
+        parser.add_argument('--images', action='store_true',
+                            help=f'Give the books covers, drawn from a pool of {COVER_COUNT} generated images.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, help='Random seed.')
+
+    def handle(self, *args, **options):
+        if options['books'] < 0 or options['users'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--books must not be negative, --users and --batch-size must be positive.')
+        if not 0 <= options['published'] <= 1:
+            raise CommandError('--published must be between 0 and 1.')
+
+        self.rng = random.Random(options['seed'])
+        self.run = uuid4().hex[:6] if options['seed'] is None else f's{options["seed"]}'
+        started = time.monotonic()
+
+        user_ids = self.create_users(options['users'])
+        covers = self.create_covers() if options['images'] else []
+        genres = upsert_by_slug(Genre, 'title', GENRES)
+        genres = [genres[name] for name in GENRES]
+        tag_names = [f'{word}-{number}' if number else word
+                     for number in range(TAG_COUNT // len(WORDS) + 1) for word in WORDS][:TAG_COUNT]
+        tags = upsert_tags(tag_names)
+        tags = [tags[name] for name in tag_names]
+        authors = self.create_authors(max(1, options['books'] // 8))
+
+        books = reviews = 0
+        content_type = ContentType.objects.get_for_model(Book)
+        numbers = range(options['books'])
+        for batch_number, batch in enumerate(batched(numbers, options['batch_size']), start=1):
+            with transaction.atomic():
+                book_ids = self.create_books(batch, authors, user_ids, covers, options['published'])
+                tag_ids = self.tag_books(book_ids, genres, tags, content_type)
+                reviews += self.create_reviews(book_ids, user_ids, options['reviews_per_book'])
+                Book.objects.filter(pk__in=book_ids).update_rating_aggregates()
+                bump_card_versions(book_ids)
+                index_books(book_ids)
+                TagStat.objects.refresh(tag_ids)
+            books += len(book_ids)
+            self.stdout.write(f'batch {batch_number}: {books} books, {reviews} reviews')
+        invalidate_genre_sidebar()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(user_ids)} users, {len(authors)} authors, {books} books and {reviews} reviews '
+            f'in {time.monotonic() - started:.1f}s (run {self.run})'
+        ))
+
+    def create_users(self, count):
+        User = get_user_model()
+        # Seeded users cannot log in; one hash is enough for all of them.
+        password = make_password(None)
+        names = [f'seed-{self.run}-{number}' for number in range(count)]
+        User.objects.bulk_create(
+            [User(username=name, email=f'{name}@example.com', password=password,
+                  first_name=self.rng.choice(FIRST_NAMES), last_name=self.rng.choice(LAST_NAMES)) for name in names],
+            batch_size=1000,
+        )
+        return list(User.objects.filter(username__in=names).order_by('pk').values_list('pk', flat=True))
+
+    def create_covers(self):
+        names = []
+        for number in range(COVER_COUNT):
+            name = default_storage.save(f'images/seed_cover_{number}.jpg', make_cover(self.rng, number))
+            generate_renditions(name)
+            names.append(name)
+        return names
+
+    def create_authors(self, count):
+        names = [f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)} {self.run}-{number}'
+                 for number in range(count)]
+        ids = upsert_by_slug(Author, 'name', names)
+        return [ids[name] for name in names]
+
+    def create_books(self, numbers, authors, user_ids, covers, published):
+        author_weights = zipf_weights(len(authors), 0.8)
+        slugs = []
+        books = []
+        for number in numbers:
+            title = f'The {self.rng.choice(ADJECTIVES)} {self.rng.choice(NOUNS)} {self.run}-{number}'
+            slug = slugify(title)
+            slugs.append(slug)
+            books.append(Book(
+                title=title,
+                slug=slug,
+                author_id=self.rng.choices(authors, cum_weights=author_weights)[0],
+                first_published=self.rng.randint(1800, 2024),
+                description=' '.join(sentence(self.rng) for _ in range(self.rng.randint(2, 8))),
+                quote=sentence(self.rng, 8) if self.rng.random() < 0.4 else '',
+                image=self.rng.choice(covers) if covers else None,
+                user_id=self.rng.choice(user_ids) if self.rng.random() < 0.5 else None,
+                status=Book.Status.PUBLISHED if self.rng.random() < published else Book.Status.DRAFT,
+            ))
+        Book.objects.bulk_create(books)
+        return list(Book.objects.filter(slug__in=slugs).order_by('pk').values_list('pk', flat=True))
+
+    def tag_books(self, book_ids, genres, tags, content_type):
+        genre_weights, tag_weights = zipf_weights(len(genres)), zipf_weights(len(tags))
+        through = Book.genre.through
+        book_genres, tagged_items = [], []
+        for book_id in book_ids:
+            for genre_id in set(self.rng.choices(genres, cum_weights=genre_weights, k=self.rng.randint(1, 3))):
+                book_genres.append(through(book_id=book_id, genre_id=genre_id))
+            for tag_id in set(self.rng.choices(tags, cum_weights=tag_weights, k=self.rng.randint(0, 6))):
+                tagged_items.append(TaggedItem(content_type=content_type, object_id=book_id, tag_id=tag_id))
+        through.objects.bulk_create(book_genres, ignore_conflicts=True)
+        TaggedItem.objects.bulk_create(tagged_items, ignore_conflicts=True)
+        return {item.tag_id for item in tagged_items}
+
+    def create_reviews(self, book_ids, user_ids, mean):
+        reviews = []
+        for book_id in book_ids:
+            for user_id in self.rng.sample(user_ids, skewed_count(self.rng, mean, len(user_ids))):
+                reviews.append(Review(
+                    book_id=book_id,
+                    user_id=user_id,
+                    rating=self.rng.choices(range(1, 6), RATING_WEIGHTS)[0],
+                    text=' '.join(sentence(self.rng) for _ in range(self.rng.randint(1, 4))),
+                ))
+        Review.objects.bulk_create(reviews, batch_size=1000)
+        return len(reviews)
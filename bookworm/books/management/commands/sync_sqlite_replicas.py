@@ -0,0 +1,28 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from bookworm.db import PRIMARY
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database over the replica files in DATABASE_REPLICAS with the online backup '
+            'API, e.g. to try the replica routing locally. Production replicas are kept up to date by the deployment.')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas are configured; set BOOKWORM_DB_REPLICAS.')
+        primary = connections[PRIMARY]
+        if primary.vendor != 'sqlite':
+            raise CommandError('The primary database is not SQLite.')
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            connections[alias].close()
+            self.stdout.write(self.style.SUCCESS(f'Copied the primary to {alias}'))
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.1 on 2024-03-25 10:00
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    content_type = ContentType.objects.filter(app_label='books', model='book').first()
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE books_book_fts USING fts5("
+        "title, description, quote, author, tags, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO books_book_fts (books_book_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 1.0, 5.0, 3.0)')"
+    )
+    schema_editor.execute(
+        "INSERT INTO books_book_fts (rowid, title, description, quote, author, tags) "
+        "SELECT b.id, b.title, b.description, b.quote, a.name, "
+        "(SELECT group_concat(t.name, ' ') FROM taggit_taggeditem ti JOIN taggit_tag t ON t.id = ti.tag_id "
+        "WHERE ti.content_type_id = %s AND ti.object_id = b.id) "
+        "FROM books_book b JOIN books_author a ON a.id = b.author_id WHERE b.status = 'published'",
+        [content_type.pk if content_type else None],
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE books_book_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('books', '0004_book_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
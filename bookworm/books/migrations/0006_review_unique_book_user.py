@@ -0,0 +1,39 @@
+# Generated by Django 4.2.1 on 2024-04-01 10:00
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_reviews(apps, schema_editor):
+    """Keep only the first review of each user for a book, as Review.save() used to."""
+    Book = apps.get_model('books', 'Book')
+    Review = apps.get_model('books', 'Review')
+    duplicates = (Review.objects.values('book', 'user').order_by()
+                  .annotate(first_id=Min('id'), count=Count('id')).filter(count__gt=1))
+    book_ids = set()
+    for duplicate in duplicates:
+        Review.objects.filter(book=duplicate['book'], user=duplicate['user']).exclude(id=duplicate['first_id']).delete()
+        book_ids.add(duplicate['book'])
+    if book_ids:
+        reviews = Review.objects.filter(book=OuterRef('pk')).order_by().values('book')
+        Book.objects.filter(pk__in=book_ids).update(
+            reviews_count=Coalesce(Subquery(reviews.annotate(c=Count('pk')).values('c')), 0),
+            rating_sum=Coalesce(Subquery(reviews.annotate(s=Sum('rating')).values('s')), 0),
+            rating_avg=Coalesce(Subquery(reviews.annotate(a=Avg('rating')).values('a')), 0.0),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_book_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_reviews, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('book', 'user'), name='unique_review_per_book_user'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.1 on 2024-04-08 10:00
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_review_time_create(apps, schema_editor):
+    Review = apps.get_model('books', 'Review')
+    Review.objects.update(time_update=F('time_create'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_review_unique_book_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='time_update',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='time_update',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_review_time_create, migrations.RunPython.noop),
+    ]
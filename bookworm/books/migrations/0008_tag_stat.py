@@ -0,0 +1,47 @@
+# Generated by Django 4.2.1 on 2024-04-15 10:00
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def count_published_books(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Tag = apps.get_model('taggit', 'Tag')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    TagStat = apps.get_model('books', 'TagStat')
+    content_type = ContentType.objects.filter(app_label='books', model='book').first()
+    counts = {}
+    if content_type is not None:
+        published = Book.objects.filter(status='published').values('pk')
+        counts = dict(
+            TaggedItem.objects.filter(content_type=content_type, object_id__in=published)
+            .order_by().values_list('tag').annotate(n=Count('pk'))
+        )
+    TagStat.objects.bulk_create(
+        [TagStat(tag_id=tag_id, published_count=counts.get(tag_id, 0))
+         for tag_id in Tag.objects.values_list('pk', flat=True)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        ('books', '0007_author_review_time_update'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagStat',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True,
+                                             related_name='stat', serialize=False, to='taggit.tag')),
+                ('published_count', models.PositiveIntegerField(db_index=True, default=0)),
+            ],
+        ),
+        migrations.RunPython(count_published_books, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:42
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_similar_book'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='author_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(django.db.models.functions.text.Lower('title'), name='genre_title_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+def fold_names(apps, schema_editor):
+    for model_name, field_name in (('Author', 'name'), ('Genre', 'title')):
+        model = apps.get_model('books', model_name)
+        rows = list(model.objects.only('pk', field_name))
+        for row in rows:
+            setattr(row, f'{field_name}_casefold', getattr(row, field_name).casefold()[:255])
+        model.objects.bulk_update(rows, [f'{field_name}_casefold'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='name_casefold',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='title_casefold',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fold_names, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='author',
+            name='author_name_lower_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='genre',
+            name='genre_title_lower_idx',
+        ),
+    ]
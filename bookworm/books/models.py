@@ -1,14 +1,100 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models.signals import post_save
+from django.db.models import Avg, Case, Count, F, FloatField, OuterRef, Prefetch, Subquery, Sum, Value, When, Window
+from django.db.models.functions import Cast, Coalesce, RowNumber
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.text import slugify
 from taggit.managers import TaggableManager
+from taggit.models import Tag
 
 
 User = get_user_model()
 
 
-class PublishedManager(models.Manager):
+class BookQuerySet(models.QuerySet):
+    def for_listing(self, prefetch=True):
+        """
+        Attach everything a book card renders, so that a page of books costs a
+        fixed number of queries however many books it shows.
+
+        With ``prefetch=False`` only the joins are added; the prefetch lookups
+        can then be applied to the books that really need them.
+        """
+        queryset = self.select_related('author', 'user')
+        if prefetch:
+            queryset = queryset.prefetch_related(*self.listing_prefetches())
+        return queryset
+
+    @staticmethod
+    def listing_prefetches():
+        """
+        Get the prefetch lookups of the book card plan.
+
+        Only the latest review of each book is fetched; it lands in the
+        ``latest_reviews`` attribute.
+
+        Returns:
+            list: The lookups for prefetch_related().
+        """
+        latest_reviews = Review.objects.select_related('user').annotate(
+            position=Window(RowNumber(), partition_by=F('book'), order_by=[F('time_create').desc(), F('pk').desc()]),
+        ).filter(position=1)
+        return [
+            Prefetch('genre'),
+            Prefetch('tags'),
+            Prefetch('reviews', queryset=latest_reviews, to_attr='latest_reviews'),
+        ]
+
+    def tag_ids(self):
+        """
+        Get the ids of the tags of the books.
+
+        Returns:
+            set: The tag ids.
+        """
+        return set(self.order_by().filter(tags__isnull=False).values_list('tags', flat=True).distinct())
+
+    def update_rating_aggregates(self):
+        """
+        Recompute the stored rating aggregates from the reviews table.
+
+        Runs as a single UPDATE with correlated subqueries, so no review rows
+        are loaded into Python.
+
+        Returns:
+            int: The number of books updated.
+        """
+        reviews = Review.objects.filter(book=OuterRef('pk')).order_by().values('book')
+        return self.update(
+            reviews_count=Coalesce(Subquery(reviews.annotate(c=Count('pk')).values('c')), 0),
+            rating_sum=Coalesce(Subquery(reviews.annotate(s=Sum('rating')).values('s')), 0),
+            rating_avg=Coalesce(Subquery(reviews.annotate(a=Avg('rating')).values('a')), 0.0),
+        )
+
+    def shift_rating_aggregates(self, rating, count=1):
+        """
+        Add (or, with a negative ``count``, remove) reviews of the given rating
+        to the stored aggregates without reading the reviews table.
+
+        Returns:
+            int: The number of books updated.
+        """
+        new_count = F('reviews_count') + count
+        new_sum = F('rating_sum') + rating * count
+        return self.update(
+            reviews_count=new_count,
+            rating_sum=new_sum,
+            rating_avg=Case(
+                When(reviews_count__lte=-count, then=Value(0.0)),
+                default=Cast(new_sum, FloatField()) / new_count,
+                output_field=FloatField(),
+            ),
+        )
+
+
+class PublishedManager(models.Manager.from_queryset(BookQuerySet)):
     """A status for books newly added to the site."""
     def get_queryset(self):
         return super().get_queryset().filter(status=Book.Status.PUBLISHED)
@@ -32,9 +118,16 @@ class Book(models.Model):
         tags (TaggableManager): Tags associated with the book.
         user (ForeignKey): The user who added the book.
         status (CharField): Indicates whether the book is published or in draft.
+        reviews_count (PositiveIntegerField): Number of reviews, maintained on review changes.
+        rating_sum (PositiveIntegerField): Sum of all review ratings, maintained on review changes.
+        rating_avg (FloatField): Mean review rating, maintained on review changes.
+        similar_updated (DateTimeField): When the similar books were last computed; empty
+            while they are out of date.
 
     Methods:
         average_rating(): Calculate the average rating of the book.
+        last_review(): Get the most recent review of the book.
+        similar_books(): Get the precomputed similar books.
         get_absolute_url(): Get the canonical URL for the book detail page.
 
     """
@@ -55,8 +148,16 @@ class Book(models.Model):
     tags = TaggableManager(ordering=["name"], blank=True)
     user = models.ForeignKey(get_user_model(), on_delete=models.SET_NULL, null=True, default=None, related_name='books')
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.DRAFT)
+    reviews_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False)
+    similar_updated = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
+    RATING_FIELDS = ('reviews_count', 'rating_sum', 'rating_avg')
+    # Fields written by the signals and commands rather than by edits of the book.
+    DERIVED_FIELDS = RATING_FIELDS + ('similar_updated',)
 
-    objects = models.Manager()
+    objects = BookQuerySet.as_manager()
     published = PublishedManager()
 
     class Meta:
@@ -65,24 +166,74 @@ class Book(models.Model):
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the stored status, so that publishing can be told apart from other edits."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    @property
+    def status_changed(self):
+        """
+        Check whether the status differs from the one last loaded or saved.
+
+        Returns:
+            bool: True for new books and books whose status was changed.
+        """
+        return getattr(self, '_loaded_status', None) != self.status
+
     def save(self, *args, **kwargs):
-        """Save method to generate the slug."""
+        """
+        Save method to generate the slug.
+
+        The rating aggregates and the similar books timestamp are owned by the
+        signals and commands, so an update of an existing book never writes back
+        their (possibly stale) in-memory values.
+        """
         self.slug = slugify(self.title)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.DERIVED_FIELDS
+            ]
         super(Book, self).save(*args, **kwargs)
 
     def average_rating(self):
         """
-        Calculate the average rating of the book.
+        Get the average rating of the book from the stored aggregates.
 
         Returns:
             int: The average rating of the book.
         """
-        reviews = self.reviews.all()
-        if reviews:
-            total_rating = sum(review.rating for review in reviews)
-            return round(total_rating / len(reviews))
+        if self.reviews_count:
+            return round(self.rating_avg)
         return 0
 
+    @property
+    def last_review(self):
+        """
+        Get the most recent review of the book.
+
+        Uses the review prefetched by BookQuerySet.for_listing() when present.
+
+        Returns:
+            Review: The latest review, or None if the book has no reviews.
+        """
+        if hasattr(self, 'latest_reviews'):
+            return self.latest_reviews[0] if self.latest_reviews else None
+        return self.reviews.first()
+
+    def similar_books(self):
+        """
+        Get the published books most similar to this one, as computed by the
+        rebuild_similar_books command, most similar first.
+
+        Returns:
+            QuerySet: The books, with their authors.
+        """
+        return Book.published.filter(similar_of__book=self).select_related('author').order_by('similar_of__rank')
+
     def get_absolute_url(self):
         """
         Get the canonical URL for the book detail page.
@@ -102,11 +253,16 @@ class Author(models.Model):
         description (TextField): A brief description or biography of the author.
         slug (SlugField): A slugified version of the author's name for use in URLs.
         photo (ImageField): An optional photo/image of the author.
+        time_update (DateTimeField): The date and time the author record was last updated.
+        name_casefold (CharField): The casefolded name, for case-insensitive prefix searches.
     """
     name = models.CharField(max_length=255, db_index=True)
     description = models.TextField(blank=True)
     slug = models.SlugField(max_length=255, unique=True, db_index=True)
     photo = models.ImageField(upload_to='photos/', default=None, blank=True, null=True)
+    time_update = models.DateTimeField(auto_now=True)
+    # Folded in Python, as SQLite's LOWER() only lowercases ASCII letters.
+    name_casefold = models.CharField(max_length=255, editable=False, db_index=True)
 
     def __str__(self):
         return self.name
@@ -114,6 +270,11 @@ class Author(models.Model):
     class Meta:
         ordering = ['name']
 
+    def save(self, *args, **kwargs):
+        """Save the author, keeping its casefolded name in step."""
+        self.name_casefold = self.name.casefold()[:255]
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         """
         Returns the canonical URL for the author.
@@ -131,9 +292,11 @@ class Genre(models.Model):
     Attributes:
         title (CharField): The title of the genre.
         slug (SlugField): A slugified version of the genre's title for use in URLs.
+        title_casefold (CharField): The casefolded title, for case-insensitive prefix searches.
     """
     title = models.CharField(max_length=255, db_index=True)
     slug = models.SlugField(max_length=255, unique=True, db_index=True)
+    title_casefold = models.CharField(max_length=255, editable=False, db_index=True)
 
     def __str__(self):
         return self.title
@@ -141,6 +304,11 @@ class Genre(models.Model):
     class Meta:
         ordering = ['title']
 
+    def save(self, *args, **kwargs):
+        """Save the genre, keeping its casefolded title in step."""
+        self.title_casefold = self.title.casefold()[:255]
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         """
         Returns the canonical URL for the genre.
@@ -151,36 +319,171 @@ class Genre(models.Model):
         return reverse('genre', kwargs={'genre_slug': self.slug})
 
 
+class SimilarBook(models.Model):
+    """
+    One of the precomputed most similar books of a book.
+
+    Attributes:
+        book (ForeignKey): The book.
+        similar (ForeignKey): A book similar to it.
+        rank (PositiveSmallIntegerField): Position in the book's list, from 1 for the most similar.
+        score (FloatField): Cosine similarity of the two books, from 0 to 1.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_links')
+    similar = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_of')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['book', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='unique_similar_book_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.book_id} ~ {self.similar_id}'
+
+
+class TagStatManager(models.Manager):
+    def refresh(self, tag_ids=None):
+        """
+        Recount the published books of the given tags, or of all tags.
+
+        The counts are computed with one aggregate query and written with one
+        upsert, so the cost depends on the number of tags, not of books.
+        Tags without published books are stored with a count of zero.
+
+        Returns:
+            int: The number of tags refreshed.
+        """
+        tags = Tag.objects.all() if tag_ids is None else Tag.objects.filter(pk__in=list(tag_ids))
+        tag_ids = list(tags.values_list('pk', flat=True))
+        if not tag_ids:
+            return 0
+        counts = dict(
+            Book.published.filter(tags__in=tag_ids).order_by().values_list('tags').annotate(n=Count('pk'))
+        )
+        self.bulk_create(
+            [TagStat(tag_id=tag_id, published_count=counts.get(tag_id, 0)) for tag_id in tag_ids],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['tag'],
+            update_fields=['published_count'],
+        )
+        return len(tag_ids)
+
+
+class TagStat(models.Model):
+    """
+    The number of published books of a tag, maintained on tag and status
+    changes so that tag listings never count through the tagged items table.
+
+    Attributes:
+        tag (OneToOneField): The tag.
+        published_count (PositiveIntegerField): Number of published books with the tag.
+    """
+    tag = models.OneToOneField(Tag, on_delete=models.CASCADE, primary_key=True, related_name='stat')
+    published_count = models.PositiveIntegerField(default=0, db_index=True)
+
+    objects = TagStatManager()
+
+    def __str__(self):
+        return f'{self.tag_id}: {self.published_count}'
+
+
+class ReviewManager(models.Manager):
+    def submit(self, book, user, rating, text):
+        """
+        Create the user's review of a book, or update it if there is one.
+
+        The review is inserted with INSERT ... ON CONFLICT DO NOTHING, backed
+        by the unique (book, user) constraint, so concurrent submissions can
+        never create duplicates; when the insert returns no row the review
+        exists and is updated instead, and which statement returned it tells
+        whether it was created. post_save is sent as for a regular save,
+        inside the same transaction.
+
+        Returns:
+            tuple: The review and True if it was created, False if updated.
+        """
+        db = router.db_for_write(Review)
+        connection = connections[db]
+        table = connection.ops.quote_name(Review._meta.db_table)
+        now = timezone.now()
+        timestamp = Review._meta.get_field('time_update').get_db_prep_value(now, connection)
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            row = None
+            while row is None:
+                cursor.execute(
+                    f'INSERT INTO {table} (book_id, user_id, text, rating, time_create, time_update) '
+                    f'VALUES (%s, %s, %s, %s, %s, %s) ON CONFLICT (book_id, user_id) DO NOTHING RETURNING id',
+                    [book.pk, user.pk, text, rating, timestamp, timestamp],
+                )
+                row = cursor.fetchone()
+                created = row is not None
+                if not created:
+                    # No row if the review was deleted since the insert; then it is inserted again.
+                    cursor.execute(
+                        f'UPDATE {table} SET text = %s, rating = %s, time_update = %s '
+                        f'WHERE book_id = %s AND user_id = %s RETURNING id',
+                        [text, rating, timestamp, book.pk, user.pk],
+                    )
+                    row = cursor.fetchone()
+            review = Review(pk=row[0], book=book, user=user, text=text, rating=rating, time_update=now)
+            if created:
+                review.time_create = now
+            review._state.adding = False
+            review._state.db = db
+            post_save.send(sender=Review, instance=review, created=created, update_fields=None, raw=False, using=db)
+        return review, created
+
+
 class Review(models.Model):
     """
     Represents a review of a book written by a user.
 
+    A user can review a book only once.
+
     Attributes:
         book (ForeignKey): The book being reviewed.
         user (ForeignKey): The user who wrote the review.
         text (TextField): The text content of the review.
         time_create (DateTimeField): The date and time when the review was created.
+        time_update (DateTimeField): The date and time when the review was last updated.
         rating (IntegerField): The rating given by the user to the book (1 to 5).
     """
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
     text = models.TextField()
     time_create = models.DateTimeField(auto_now_add=True)
+    time_update = models.DateTimeField(auto_now=True)
     rating = models.IntegerField(default=0, choices=[(i, i) for i in range(1, 6)])
 
+    objects = ReviewManager()
+
     class Meta:
         ordering = ['-time_create']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'user'], name='unique_review_per_book_user'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the stored book, so that a review moved to another book updates both."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_book_id = instance.__dict__.get('book_id')
+        return instance
+
     def save(self, *args, **kwargs):
         """
         Saves the review object.
 
-        Checks if a review already exists for the same book by the same user.
-        If not, saves the review object.
+        The save runs in a transaction together with the update of the book's
+        rating aggregates.
         """
-        existing_review = Review.objects.filter(book=self.book, user=self.user).exists()
-        if not existing_review:
+        using = kwargs.get('using') or router.db_for_write(Review, instance=self)
+        with transaction.atomic(using=using):
             super().save(*args, **kwargs)
@@ -0,0 +1,210 @@
+"""
+Full-page cache for anonymous visitors, invalidated by surrogate keys.
+
+Pages opt in by returning surrogate keys from get_surrogate_keys() (see
+ConditionalGetMixin): ``book:<id>``, ``author:<id>``, ``genre:<id>``,
+``tag:<slug>``, ``listing`` for pages of book cards and ``sidebar`` for
+every page with the genre sidebar. AnonymousPageCacheMiddleware stores
+those pages when they are rendered for a visitor without a session, and
+serves them to such visitors without running the rest of the stack.
+
+Each key has a version in the cache, and a page is only served while all
+the versions it was stored with are current. purge_pages() replaces the
+versions of some keys, which retires every page tagged with any of them;
+the signals call it with exactly the keys a change affects.
+
+Visitors with a session cookie (everyone logged in) or pending messages
+always get a freshly rendered page, and pages that set cookies are never
+stored, so a cached page never carries anyone's state.
+"""
+import time
+from hashlib import md5
+from uuid import uuid4
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from bookworm.db import PIN_COOKIE
+
+PAGE_KEY = 'page:{}'
+SURROGATE_KEY = 'page_surrogate_key:{}'
+LISTING = 'listing'
+SIDEBAR = 'sidebar'
+
+
+def book_key(book_id):
+    return f'book:{book_id}'
+
+
+def author_key(author_id):
+    return f'author:{author_id}'
+
+
+def genre_key(genre_id):
+    return f'genre:{genre_id}'
+
+
+def tag_key(slug):
+    return f'tag:{slug}'
+
+
+def cache_is_shared():
+    """
+    Check whether the default cache is shared between processes, so that
+    what one process stores there is seen by the others.
+
+    Returns:
+        bool: False for the per-process (and dummy) backends.
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def bounded_timeout(timeout):
+    """
+    Bound the lifetime of an entry that other processes may have to drop.
+
+    Invalidations only reach the cache of the process that makes them, so
+    with a per-process cache the entries last at most
+    LOCAL_CACHE_MAX_TIMEOUT seconds.
+
+    Returns:
+        int: The timeout to store the entry with.
+    """
+    if cache_is_shared():
+        return timeout
+    return min(timeout, settings.LOCAL_CACHE_MAX_TIMEOUT)
+
+
+def purge_pages(keys):
+    """Retire every cached page tagged with any of the given surrogate keys."""
+    version = (time.time(), uuid4().hex)
+    cache.set_many({SURROGATE_KEY.format(key): version for key in keys}, timeout=None)
+
+
+def get_key_versions(keys):
+    """
+    Get the current version of each surrogate key.
+
+    A version is the time of the key's last purge and a random token. Keys
+    without a stored version get one dated 0, as nothing was purged since a
+    page could have been rendered for them.
+
+    Returns:
+        dict: Surrogate key to version.
+    """
+    cache_keys = {key: SURROGATE_KEY.format(key) for key in keys}
+    stored = cache.get_many(cache_keys.values())
+    missing = {cache_key: (0.0, uuid4().hex) for cache_key in cache_keys.values() if cache_key not in stored}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        stored = dict(missing, **stored)
+    return {key: stored[cache_key] for key, cache_key in cache_keys.items()}
+
+
+def page_cache_key(request):
+    url = f'{request.get_host()}{request.get_full_path()}'
+    return PAGE_KEY.format(md5(url.encode(), usedforsecurity=False).hexdigest())
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Serve the anonymous GETs of the pages that have surrogate keys from the
+    page cache. Put it before the session middleware, so that hits skip the
+    session, auth and messages middleware as well as the view.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_cacheable_request(request):
+            return self.get_response(request)
+        key = page_cache_key(request)
+        response = self.load(request, cache.get(key))
+        if response is None:
+            started = time.time()
+            response = self.get_response(request)
+            self.store(request, response, key, started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.is_cacheable_request(request):
+            return await self.get_response(request)
+        key = page_cache_key(request)
+        response = self.load(request, cache.get(key))
+        if response is None:
+            started = time.time()
+            response = await self.get_response(request)
+            self.store(request, response, key, started)
+        return response
+
+    @staticmethod
+    def is_cacheable_request(request):
+        return (
+            settings.PAGE_CACHE_TIMEOUT
+            and request.method in ('GET', 'HEAD')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and CookieStorage.cookie_name not in request.COOKIES
+            and PIN_COOKIE not in request.COOKIES
+        )
+
+    @staticmethod
+    def load(request, entry):
+        """
+        Rebuild the response of a cache entry if all its surrogate keys are
+        still at the versions it was stored with.
+
+        Returns:
+            HttpResponse: The response, or None.
+        """
+        if entry is None or get_key_versions(entry['keys']) != entry['keys']:
+            return None
+        response = HttpResponse(entry['content'], status=entry['status'])
+        for name, value in entry['headers']:
+            response.headers[name] = value
+        response.headers['X-Page-Cache'] = 'hit'
+        return get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+            response=response,
+        )
+
+    @staticmethod
+    def store(request, response, key, started):
+        keys = getattr(response, 'surrogate_keys', None)
+        if (
+            not keys
+            or response.status_code != 200
+            or response.streaming
+            or response.cookies
+            or getattr(request, 'user', None) is None
+            or request.user.is_authenticated
+            or 'private' in response.get('Cache-Control', '')
+        ):
+            return
+        versions = get_key_versions(keys)
+        # A purge while the page was rendering may have come after the data was read.
+        if any(purged > started for purged, token in versions.values()):
+            return
+        response.headers['Surrogate-Key'] = ' '.join(sorted(keys))
+        cache.set(key, {
+            'status': response.status_code,
+            'headers': list(response.items()),
+            'content': response.content,
+            'keys': versions,
+        }, timeout=bounded_timeout(settings.PAGE_CACHE_TIMEOUT))
+        response.headers['X-Page-Cache'] = 'miss'
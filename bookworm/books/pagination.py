@@ -0,0 +1,166 @@
+import asyncio
+import base64
+import binascii
+
+from django.core.paginator import EmptyPage, InvalidPage, Page
+
+# Range of the signed 64-bit integers that databases store; larger values cannot even be compared with a column.
+MIN_POSITION, MAX_POSITION = -2 ** 63, 2 ** 63 - 1
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def encode_cursor(direction, value):
+    """
+    Encode a position in the listing as an opaque token.
+
+    Returns:
+        str: The URL-safe token.
+    """
+    raw = f'{direction}:{value}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode a token made by encode_cursor().
+
+    Returns:
+        tuple: The direction ('n' or 'p') and the position value.
+
+    Raises:
+        InvalidCursor: If the token is malformed or its position out of range.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        direction, value = raw.split(':', 1)
+        if direction not in ('n', 'p'):
+            raise ValueError(direction)
+        value = int(value)
+        if not MIN_POSITION <= value <= MAX_POSITION:
+            raise ValueError(value)
+        return direction, value
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+
+class CursorPage:
+    """A page of a cursor-paginated listing; it knows its neighbours but not the total count."""
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset paginator that seeks on a unique integer ordering field instead of
+    counting rows and scanning past an OFFSET, so every page costs the same.
+
+    The field defaults to the first field of the model's Meta.ordering. Works
+    on model and values() querysets.
+    """
+    def __init__(self, queryset, per_page, ordering=None):
+        ordering = ordering or queryset.model._meta.ordering[0]
+        self.field = ordering.lstrip('-')
+        self.descending = ordering.startswith('-')
+        self.queryset = queryset.order_by(ordering)
+        self.per_page = per_page
+
+    def _value(self, obj):
+        return obj[self.field] if isinstance(obj, dict) else getattr(obj, self.field)
+
+    def _seek(self, value, forward):
+        lookup = 'lt' if forward == self.descending else 'gt'
+        queryset = self.queryset if forward else self.queryset.reverse()
+        if value is not None:
+            queryset = queryset.filter(**{f'{self.field}__{lookup}': value})
+        return queryset[:self.per_page + 1]
+
+    def page(self, cursor=None):
+        """
+        Get the page a cursor points to; no cursor means the first page.
+
+        Returns:
+            CursorPage: The page.
+        """
+        direction, value = decode_cursor(cursor) if cursor else ('n', None)
+        forward = direction == 'n'
+        return self._make_page(list(self._seek(value, forward)), value, forward)
+
+    async def apage(self, cursor=None):
+        """Async version of page(), fetching the rows with the async ORM."""
+        direction, value = decode_cursor(cursor) if cursor else ('n', None)
+        forward = direction == 'n'
+        return self._make_page([obj async for obj in self._seek(value, forward)], value, forward)
+
+    def _make_page(self, objects, value, forward):
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if not forward:
+            objects.reverse()
+        if not objects:
+            return CursorPage(objects)
+
+        first, last = self._value(objects[0]), self._value(objects[-1])
+        has_next = has_more if forward else True
+        has_previous = value is not None if forward else has_more
+        return CursorPage(
+            objects,
+            next_cursor=encode_cursor('n', last) if has_next else None,
+            previous_cursor=encode_cursor('p', first) if has_previous else None,
+        )
+
+
+async def alist(queryset):
+    """Evaluate a queryset with the async ORM, as a coroutine that can be gathered."""
+    return [obj async for obj in queryset]
+
+
+async def apaginate(paginator, number):
+    """
+    Get a page of a Django Paginator with the async ORM.
+
+    The rows are counted and the page is fetched at the same time; the page
+    is validated once the count is known.
+
+    Returns:
+        Page: The page.
+
+    Raises:
+        InvalidPage: If the page number is out of range.
+    """
+    number = int(number)
+    if number < 1:
+        raise EmptyPage('That page number is less than 1')
+    bottom = (number - 1) * paginator.per_page
+    if bottom > MAX_POSITION:
+        raise EmptyPage('That page contains no results')
+    count, objects = await asyncio.gather(
+        paginator.object_list.acount(),
+        alist(paginator.object_list[bottom:bottom + paginator.per_page + paginator.orphans]),
+    )
+    # count is a cached_property, so this is what Paginator.count would have computed.
+    paginator.count = count
+    number = paginator.validate_number(number)
+    top = bottom + paginator.per_page
+    if top + paginator.orphans >= count:
+        top = count
+    return Page(objects[:top - bottom], number, paginator)
@@ -0,0 +1,147 @@
+import re
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, router
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from taggit.models import Tag, TaggedItem
+
+from .models import Author, Book
+
+FTS_TABLE = 'books_book_fts'
+# bm25() weights of the indexed columns: title, description, quote, author, tags.
+FTS_RANK = 'bm25(10.0, 1.0, 1.0, 5.0, 3.0)'
+MAX_QUERY_TERMS = 10
+HIGHLIGHT_START, HIGHLIGHT_END = '\x02', '\x03'
+INDEX_BATCH_SIZE = 500
+
+
+def search_available(using=None):
+    """
+    Check whether the full-text index can be used.
+
+    Returns:
+        bool: True if the database is SQLite, which provides FTS5.
+    """
+    return connections[using or router.db_for_read(Book)].vendor == 'sqlite'
+
+
+def build_match_expression(query):
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term and all terms must match, so user
+    input can never be parsed as FTS5 syntax.
+
+    Returns:
+        str: The MATCH expression, empty if the query has no words.
+    """
+    terms = re.findall(r'\w+', query)[:MAX_QUERY_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _index_select_sql():
+    return (
+        f'SELECT b.id, b.title, b.description, b.quote, a.name, '
+        f"(SELECT group_concat(t.name, ' ') FROM {TaggedItem._meta.db_table} ti "
+        f'JOIN {Tag._meta.db_table} t ON t.id = ti.tag_id '
+        f'WHERE ti.content_type_id = %s AND ti.object_id = b.id) '
+        f'FROM {Book._meta.db_table} b JOIN {Author._meta.db_table} a ON a.id = b.author_id '
+        f'WHERE b.status = %s'
+    )
+
+
+def _index_params():
+    return [ContentType.objects.get_for_model(Book).pk, Book.Status.PUBLISHED]
+
+
+def index_books(book_ids):
+    """
+    Bring the index entries of the given books up to date.
+
+    Published books are (re)indexed, everything else is removed from the
+    index, so this also covers unpublishing and deletion.
+    """
+    book_ids = list(book_ids)
+    connection = connections[router.db_for_write(Book)]
+    if connection.vendor != 'sqlite' or not book_ids:
+        return
+    with connection.cursor() as cursor:
+        for start in range(0, len(book_ids), INDEX_BATCH_SIZE):
+            batch = book_ids[start:start + INDEX_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', batch)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description, quote, author, tags) '
+                f'{_index_select_sql()} AND b.id IN ({placeholders})',
+                _index_params() + batch,
+            )
+
+
+def rebuild_index():
+    """
+    Rebuild the whole index from the published books.
+
+    Returns:
+        int: The number of indexed books.
+    """
+    connection = connections[router.db_for_write(Book)]
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, quote, author, tags) {_index_select_sql()}',
+            _index_params(),
+        )
+        count = cursor.rowcount
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) VALUES ('rank', %s)", [FTS_RANK])
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return count
+
+
+def highlight(snippet):
+    """Escape a snippet and turn the FTS5 match markers into <mark> tags."""
+    return mark_safe(escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+
+class SearchResults:
+    """
+    Lazily evaluated, BM25-ranked search results that Django's Paginator can
+    count and slice. Each slice is one FTS5 query plus one query for the books.
+    """
+    def __init__(self, query):
+        self.query = query
+        self.match = build_match_expression(query)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = 0
+            if self.match:
+                with connections[router.db_for_read(Book)].cursor() as cursor:
+                    cursor.execute(f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [self.match])
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop = item.start or 0, item.stop
+        if not self.match or stop is None or stop <= start:
+            return []
+        with connections[router.db_for_read(Book)].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, snippet({FTS_TABLE}, -1, %s, %s, %s, 24) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s OFFSET %s',
+                [HIGHLIGHT_START, HIGHLIGHT_END, '…', self.match, stop - start, start],
+            )
+            rows = cursor.fetchall()
+        books = Book.published.select_related('author').in_bulk([book_id for book_id, snippet in rows])
+        results = []
+        for book_id, snippet in rows:
+            if book_id in books:
+                books[book_id].snippet = highlight(snippet)
+                results.append(books[book_id])
+        return results
@@ -0,0 +1,181 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from taggit.models import Tag, TaggedItem
+
+from .cache import bump_card_versions, invalidate_genre_sidebar, invalidate_user_activity_counts
+from .images import schedule_renditions
+from .models import Author, Book, Genre, Review, TagStat
+from .pagecache import LISTING, author_key, book_key, genre_key, purge_pages, tag_key
+from .search import index_books
+from .similar import mark_similar_stale
+
+# Sent with ``book_ids`` whenever books are published or withdrawn, including
+# bulk status updates that bypass Book.save().
+book_status_changed = Signal()
+
+
+def purge_book_pages(book_ids, *keys):
+    """Purge the cached pages of the given books and the listings, plus any other keys."""
+    purge_pages([LISTING, *keys] + [book_key(book_id) for book_id in book_ids])
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    """
+    Keep the book's rating aggregates in step with a created or edited
+    review, and the previous book's too if the review was moved.
+    """
+    if created:
+        book_ids = [instance.book_id]
+        Book.objects.filter(pk=instance.book_id).shift_rating_aggregates(instance.rating)
+        mark_similar_stale(book_ids)
+        invalidate_user_activity_counts([instance.user_id])
+    else:
+        book_ids = list({instance.book_id, getattr(instance, '_loaded_book_id', None)} - {None})
+        Book.objects.filter(pk__in=book_ids).update_rating_aggregates()
+        if len(book_ids) > 1:
+            mark_similar_stale(book_ids)
+    bump_card_versions(book_ids)
+    purge_book_pages(book_ids)
+    instance._loaded_book_id = instance.book_id
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    """Remove a deleted review from the book's rating aggregates."""
+    Book.objects.filter(pk=instance.book_id).shift_rating_aggregates(instance.rating, count=-1)
+    bump_card_versions([instance.book_id])
+    purge_book_pages([instance.book_id])
+    mark_similar_stale([instance.book_id])
+    invalidate_user_activity_counts([instance.user_id])
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, **kwargs):
+    bump_card_versions([instance.pk])
+    purge_book_pages([instance.pk])
+    invalidate_user_activity_counts([instance.user_id])
+
+    def renditions_done():
+        bump_card_versions([instance.pk])
+        purge_book_pages([instance.pk])
+
+    schedule_renditions(instance.image, on_done=renditions_done)
+    if instance.status_changed and (not created or instance.status == Book.Status.PUBLISHED):
+        book_status_changed.send(sender=Book, book_ids=[instance.pk])
+    else:
+        index_books([instance.pk])
+    instance._loaded_status = instance.status
+
+
+@receiver(pre_delete, sender=Book)
+def book_deleting(sender, instance, **kwargs):
+    # The tagged items are gone by post_delete.
+    if instance.status == Book.Status.PUBLISHED:
+        instance._tag_ids = Book.objects.filter(pk=instance.pk).tag_ids()
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    bump_card_versions([instance.pk])
+    purge_book_pages([instance.pk])
+    invalidate_user_activity_counts([instance.user_id])
+    if instance.status == Book.Status.PUBLISHED:
+        TagStat.objects.refresh(getattr(instance, '_tag_ids', ()))
+        book_status_changed.send(sender=Book, book_ids=[instance.pk])
+
+
+@receiver(book_status_changed)
+def book_publication_changed(sender, book_ids, **kwargs):
+    invalidate_genre_sidebar()
+    index_books(book_ids)
+    TagStat.objects.refresh(Book.objects.filter(pk__in=book_ids).tag_ids())
+    mark_similar_stale(book_ids)
+    invalidate_user_activity_counts(set(Book.objects.filter(pk__in=book_ids).values_list('user_id', flat=True)))
+
+
+@receiver(post_save, sender=Author)
+def author_changed(sender, instance, **kwargs):
+    schedule_renditions(instance.photo)
+    book_ids = list(instance.books.values_list('pk', flat=True))
+    bump_card_versions(book_ids)
+    purge_pages([LISTING, author_key(instance.pk)])
+    index_books(book_ids)
+
+
+@receiver(post_save, sender=Genre)
+def genre_changed(sender, instance, **kwargs):
+    bump_card_versions(instance.books.values_list('pk', flat=True))
+    invalidate_genre_sidebar()
+    purge_pages([genre_key(instance.pk)])
+
+
+@receiver(post_delete, sender=Genre)
+def genre_deleted(sender, instance, **kwargs):
+    invalidate_genre_sidebar()
+    purge_pages([genre_key(instance.pk)])
+
+
+@receiver(pre_save, sender=Tag)
+def tag_saving(sender, instance, **kwargs):
+    # A renamed tag's pages were cached under its old slug.
+    instance._stored_slug = Tag.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    book_ids = list(Book.objects.filter(tags=instance).values_list('pk', flat=True))
+    bump_card_versions(book_ids)
+    slugs = {instance.slug, getattr(instance, '_stored_slug', None)} - {None}
+    purge_book_pages(book_ids, *(tag_key(slug) for slug in slugs))
+    index_books(book_ids)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    instance._book_ids = list(Book.objects.filter(tags=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    bump_card_versions(instance._book_ids)
+    purge_book_pages(instance._book_ids, tag_key(instance.slug))
+    index_books(instance._book_ids)
+    mark_similar_stale(instance._book_ids)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # Clearing a genre's books does not say which books they were.
+        instance._cleared_book_ids = list(instance.books.values_list('pk', flat=True))
+    if not action.startswith('post_'):
+        return
+    invalidate_genre_sidebar()
+    if not reverse:
+        book_ids = [instance.pk]
+    elif pk_set is not None:
+        book_ids = pk_set
+    else:
+        book_ids = getattr(instance, '_cleared_book_ids', [])
+    bump_card_versions(book_ids)
+    mark_similar_stale(book_ids)
+
+
+@receiver(m2m_changed, sender=TaggedItem)
+def book_tags_changed(sender, instance, action, pk_set, **kwargs):
+    if not isinstance(instance, Book):
+        return
+    if action == 'pre_clear':
+        # Clearing a book's tags does not say which tags they were.
+        instance._cleared_tag_ids = Book.objects.filter(pk=instance.pk).tag_ids()
+    if not action.startswith('post_'):
+        return
+    tag_ids = pk_set if pk_set is not None else getattr(instance, '_cleared_tag_ids', ())
+    slugs = Tag.objects.filter(pk__in=tag_ids).values_list('slug', flat=True)
+    bump_card_versions([instance.pk])
+    purge_book_pages([instance.pk], *(tag_key(slug) for slug in slugs))
+    index_books([instance.pk])
+    mark_similar_stale([instance.pk])
+    if instance.status == Book.Status.PUBLISHED:
+        TagStat.objects.refresh(tag_ids)
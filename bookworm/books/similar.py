@@ -0,0 +1,175 @@
+"""
+"Readers also liked" recommendations, computed offline.
+
+Every published book is described by a sparse vector of its genres, tags
+and the users who reviewed it, each weighted by how rare it is (idf), and
+its most similar books are the ones with the highest cosine similarity.
+The neighbours are found through an inverted index, so a book is only
+compared with books it shares something with, and the books are processed
+in batches that are each written in one transaction.
+
+The results live in SimilarBook; the rebuild_similar_books command fills
+it, and the signals mark the books whose inputs changed so that it can
+refresh just those.
+"""
+import heapq
+import math
+from collections import defaultdict
+from operator import itemgetter
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+from taggit.models import TaggedItem
+
+from .models import Book, Review, SimilarBook
+from .pagecache import book_key, purge_pages
+
+# Relative weight of each kind of feature, before idf weighting.
+FEATURE_WEIGHTS = {'genre': 1.0, 'tag': 1.5, 'reader': 1.0}
+TOP_K = 6
+# Features shared by more books than this still count in the similarity,
+# but are not used to find candidates: walking their books would dominate
+# the run while adding little signal.
+MAX_POSTINGS = 1000
+
+
+def mark_similar_stale(book_ids):
+    """Mark the similar books of the given books as out of date."""
+    Book.objects.filter(pk__in=book_ids).update(similar_updated=None)
+
+
+def load_vectors():
+    """
+    Build the feature vector of every published book.
+
+    Returns:
+        dict: Book id to a dict of feature to weight, with unit length.
+    """
+    published = Book.published.values('pk')
+    features = defaultdict(set)
+    for book_id, genre_id in Book.genre.through.objects.filter(book__in=published).values_list('book_id', 'genre_id'):
+        features[book_id].add(('genre', genre_id))
+    tagged = TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(Book), object_id__in=published)
+    for book_id, tag_id in tagged.values_list('object_id', 'tag_id'):
+        features[book_id].add(('tag', tag_id))
+    for book_id, user_id in Review.objects.filter(book__in=published).values_list('book_id', 'user_id'):
+        features[book_id].add(('reader', user_id))
+
+    book_ids = list(published.values_list('pk', flat=True))
+    frequency = defaultdict(int)
+    for book_features in features.values():
+        for feature in book_features:
+            frequency[feature] += 1
+    vectors = {}
+    for book_id in book_ids:
+        vector = {
+            feature: FEATURE_WEIGHTS[feature[0]] * math.log(1 + len(book_ids) / frequency[feature])
+            for feature in features.get(book_id, ())
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        vectors[book_id] = {feature: weight / norm for feature, weight in vector.items()} if norm else {}
+    return vectors
+
+
+def build_index(vectors):
+    """
+    Invert the vectors.
+
+    Returns:
+        dict: Feature to a list of (book id, weight).
+    """
+    postings = defaultdict(list)
+    for book_id, vector in vectors.items():
+        for feature, weight in vector.items():
+            postings[feature].append((book_id, weight))
+    return postings
+
+
+def nearest(book_id, vectors, postings, k=TOP_K):
+    """
+    Find the books most similar to a book.
+
+    Returns:
+        list: Up to ``k`` (book id, score) pairs, most similar first.
+    """
+    vector = vectors.get(book_id)
+    if not vector:
+        return []
+    scores = defaultdict(float)
+    common = []
+    for feature, weight in vector.items():
+        posting = postings[feature]
+        if len(posting) > MAX_POSTINGS:
+            common.append((feature, weight))
+            continue
+        for other_id, other_weight in posting:
+            scores[other_id] += weight * other_weight
+    scores.pop(book_id, None)
+    if common and len(scores) < k:
+        # Nothing rare to go by: take candidates from the least common feature.
+        feature = min(common, key=lambda item: len(postings[item[0]]))[0]
+        for other_id, _ in postings[feature][:MAX_POSTINGS]:
+            if other_id != book_id:
+                scores.setdefault(other_id, 0.0)
+    for other_id in scores:
+        other = vectors[other_id]
+        scores[other_id] += sum(weight * other.get(feature, 0.0) for feature, weight in common)
+    return heapq.nlargest(k, ((other_id, score) for other_id, score in scores.items() if score > 0),
+                          key=itemgetter(1))
+
+
+def stale_book_ids():
+    """
+    Get the books whose similar books need computing: those whose inputs
+    changed or that were published or withdrawn, and those that list one of
+    them.
+
+    Returns:
+        set: The book ids.
+    """
+    stale = Book.objects.filter(similar_updated__isnull=True).values('pk')
+    return (set(stale.values_list('pk', flat=True))
+            | set(SimilarBook.objects.filter(similar__in=stale).values_list('book_id', flat=True)))
+
+
+def refresh_similar_books(book_ids=None, k=TOP_K, batch_size=1000, on_batch=None):
+    """
+    Compute and store the similar books of the given books, or of all
+    published books.
+
+    Books that are not published get no similar books.
+    ``on_batch`` is called with the number of books done after each batch.
+
+    Returns:
+        int: The number of books refreshed.
+    """
+    started = timezone.now()
+    vectors = load_vectors()
+    postings = build_index(vectors)
+    unpublished = Book.objects.exclude(status=Book.Status.PUBLISHED)
+    if book_ids is None:
+        book_ids = list(vectors)
+    else:
+        unpublished = unpublished.filter(pk__in=book_ids)
+        book_ids = [book_id for book_id in book_ids if book_id in vectors]
+    with transaction.atomic():
+        SimilarBook.objects.filter(book__in=unpublished.values('pk')).delete()
+        unpublished.filter(similar_updated__isnull=True).update(similar_updated=started)
+
+    book_ids.sort()
+    for done in range(0, len(book_ids), batch_size):
+        batch = book_ids[done:done + batch_size]
+        links = [
+            SimilarBook(book_id=book_id, similar_id=other_id, rank=rank, score=score)
+            for book_id in batch
+            for rank, (other_id, score) in enumerate(nearest(book_id, vectors, postings, k), start=1)
+        ]
+        with transaction.atomic():
+            SimilarBook.objects.filter(book__in=batch).delete()
+            SimilarBook.objects.bulk_create(links, batch_size=1000)
+            Book.objects.filter(pk__in=batch).update(similar_updated=started)
+        purge_pages([book_key(book_id) for book_id in batch])
+        if on_batch:
+            on_batch(done + len(batch))
+    return len(book_ids)
@@ -0,0 +1,134 @@
+'use strict';
+{
+    // Search-as-you-type for the selects and the tags input that have a data-autocomplete-url:
+    // suggestions come from the JSON endpoint ({"results": [{"id": ..., "text": ...}]}) as the user types.
+    const DELAY = 200;
+
+    function suggestions(anchor, url, getTerm, choose) {
+        const list = document.createElement('ul');
+        list.className = 'w3-ul w3-border w3-white w3-hoverable autocomplete-results';
+        list.style.display = 'none';
+        anchor.after(list);
+        let timer = null;
+        let latest = 0;
+
+        function show(results) {
+            list.replaceChildren(...results.map(result => {
+                const item = document.createElement('li');
+                item.textContent = result.text;
+                item.style.cursor = 'pointer';
+                // mousedown comes before the blur that hides the list.
+                item.addEventListener('mousedown', event => {
+                    event.preventDefault();
+                    choose(result);
+                    list.style.display = 'none';
+                });
+                return item;
+            }));
+            list.style.display = results.length ? '' : 'none';
+        }
+
+        function search() {
+            const term = getTerm();
+            if (term === null) {
+                list.style.display = 'none';
+                return;
+            }
+            const request = ++latest;
+            fetch(`${url}?q=${encodeURIComponent(term)}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (request === latest) {
+                        show(data.results);
+                    }
+                });
+        }
+
+        return {
+            list: list,
+            schedule() {
+                clearTimeout(timer);
+                timer = setTimeout(search, DELAY);
+            },
+            hide() {
+                list.style.display = 'none';
+            },
+        };
+    }
+
+    function pickFirstOnEnter(input, box) {
+        input.addEventListener('keydown', event => {
+            if (event.key === 'Enter' && box.list.style.display !== 'none' && box.list.firstChild) {
+                event.preventDefault();
+                box.list.firstChild.dispatchEvent(new MouseEvent('mousedown', {cancelable: true}));
+            }
+        });
+        input.addEventListener('input', box.schedule);
+        input.addEventListener('focus', box.schedule);
+        input.addEventListener('blur', box.hide);
+    }
+
+    function initSelect(select) {
+        const chips = document.createElement('div');
+        const input = document.createElement('input');
+        input.type = 'text';
+        input.className = 'w3-input';
+        input.placeholder = 'Type to search';
+        input.autocomplete = 'off';
+        select.style.display = 'none';
+        select.after(chips, input);
+
+        function render() {
+            chips.replaceChildren(...Array.from(select.selectedOptions).filter(option => option.value).map(option => {
+                const chip = document.createElement('span');
+                chip.className = 'w3-tag w3-teal w3-round w3-margin-right';
+                chip.textContent = option.textContent + ' ';
+                const remove = document.createElement('a');
+                remove.textContent = '×';
+                remove.href = '#';
+                remove.addEventListener('click', event => {
+                    event.preventDefault();
+                    option.remove();
+                    render();
+                });
+                chip.append(remove);
+                return chip;
+            }));
+        }
+
+        const box = suggestions(input, select.dataset.autocompleteUrl, () => input.value.trim(), result => {
+            let option = Array.from(select.options).find(option => option.value === String(result.id));
+            if (!select.multiple) {
+                Array.from(select.options).filter(option => option.value).forEach(option => option.remove());
+                option = null;
+            }
+            if (!option) {
+                option = new Option(result.text, result.id);
+                select.add(option);
+            }
+            option.selected = true;
+            input.value = '';
+            render();
+        });
+        pickFirstOnEnter(input, box);
+        render();
+    }
+
+    function initTags(input) {
+        // taggit splits on commas, and quotes the names that contain a comma or a space.
+        const quote = name => /[ ,]/.test(name) ? `"${name}"` : name;
+        const box = suggestions(input, input.dataset.autocompleteUrl, () => {
+            const term = input.value.split(',').pop().trim();
+            return term ? term : null;
+        }, result => {
+            const tags = input.value.split(',').slice(0, -1).map(tag => tag.trim()).filter(Boolean);
+            input.value = tags.concat(quote(result.text)).join(', ') + ', ';
+        });
+        pickFirstOnEnter(input, box);
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('select[data-autocomplete-url]').forEach(initSelect);
+        document.querySelectorAll('input[data-autocomplete-url]').forEach(initTags);
+    });
+}
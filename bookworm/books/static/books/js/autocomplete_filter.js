@@ -0,0 +1,14 @@
+'use strict';
+{
+    // Reload the changelist with the value picked in an autocomplete filter, keeping the other filters.
+    const $ = django.jQuery;
+    $(function() {
+        $('.autocomplete-filter select').on('change', function() {
+            const params = new URLSearchParams(this.closest('.autocomplete-filter').dataset.queryString);
+            if (this.value) {
+                params.set(this.name, this.value);
+            }
+            window.location.search = params.toString();
+        });
+    });
+}
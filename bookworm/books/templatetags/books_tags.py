@@ -1,17 +1,30 @@
 from django import template
 
-from books.models import Genre
+from bookworm.metrics import timed
+
+from books.cache import get_genre_sidebar
+from books.images import responsive_image_html
 
 register = template.Library()
 
 
 @register.inclusion_tag('books/list_genres.html')
+@timed('show_genres')
 def show_genres(genre_selected=0):
-    genres = Genre.objects.all()
+    genres = get_genre_sidebar()
     return {'genres': genres, 'genre_selected': genre_selected}
 
 
 @register.filter(name='get_last_review')
 def get_last_review(book):
-    last_review = book.reviews.order_by('-time_create').first()
-    return last_review
+    return book.last_review
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', **attrs):
+    """
+    Render an image field as a <picture> with WebP and JPEG srcsets.
+
+    Usage: {% responsive_image book.image sizes="250px" class="w3-image" %}
+    """
+    return responsive_image_html(image, sizes, **attrs)
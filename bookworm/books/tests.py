@@ -0,0 +1,559 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import Coalesce
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.views.generic import DetailView, ListView
+from PIL import Image
+from taggit.models import Tag, TaggedItem
+
+from bookworm.storage import IMMUTABLE, ContentAddressedStorage, is_content_addressed, serve_media
+
+from .cache import get_genre_sidebar
+from .images import generate_renditions, has_renditions, rendition_names
+from .models import Author, Book, Genre, Review
+from .pagination import CursorPaginator, InvalidCursor, apaginate, decode_cursor, encode_cursor
+from .similar import stale_book_ids
+from .utils import AsyncConditionalGetMixin
+
+
+class ListingQueryBudgetTests(TestCase):
+    """
+    A page of the book listings costs the same number of queries however
+    many books the catalogue has.
+    """
+    sizes = (7, 70, 700)
+    # Per page: the freshness rows and their count, the genre sidebar, the books and their count, then the
+    # prefetched genres, tags and latest reviews; the tag and genre pages also look up their tag or genre.
+    budgets = {'home': 8, 'books_by_tags': 9, 'genre': 10}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('reader', password='secret')
+        cls.author = Author.objects.create(name='Author', slug='author')
+        cls.genre = Genre.objects.create(title='Genre', slug='genre')
+        cls.tag = Tag.objects.create(name='tag', slug='tag')
+
+    def setUp(self):
+        # Nothing is served from the page and card caches, so every page is rendered in full.
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def seed(self, count):
+        """
+        Add published books, each with the genre, the tag and a review, until
+        there are ``count`` of them.
+        """
+        start = Book.objects.count()
+        books = Book.objects.bulk_create([
+            Book(title=f'Book {number}', slug=f'book-{number}', author=self.author, user=self.user,
+                 first_published=2000, status=Book.Status.PUBLISHED)
+            for number in range(start, count)
+        ])
+        Book.genre.through.objects.bulk_create([
+            Book.genre.through(book_id=book.pk, genre_id=self.genre.pk) for book in books
+        ])
+        content_type = ContentType.objects.get_for_model(Book)
+        TaggedItem.objects.bulk_create([
+            TaggedItem(tag=self.tag, content_type=content_type, object_id=book.pk) for book in books
+        ])
+        Review.objects.bulk_create([Review(book=book, user=self.user, text='Good', rating=4) for book in books])
+
+    def test_listing_queries_do_not_grow_with_the_catalogue(self):
+        urls = {
+            'home': reverse('home'),
+            'books_by_tags': reverse('books_by_tags', kwargs={'tag': self.tag.slug}),
+            'genre': reverse('genre', kwargs={'genre_slug': self.genre.slug}),
+        }
+        for size in self.sizes:
+            self.seed(size)
+            for name, url in urls.items():
+                with self.subTest(url=url, books=size):
+                    cache.clear()
+                    with self.assertNumQueries(self.budgets[name]):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.context['books']), 7)
+
+
+class ConcurrentReviewTests(TransactionTestCase):
+    """
+    Reviews submitted and updated from several threads at once leave the
+    book's stored rating aggregates equal to a fresh aggregate of its
+    reviews.
+    """
+    threads = 8
+    rounds = 5
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        author = Author.objects.create(name='Author', slug='author')
+        self.book = Book.objects.create(title='Book', author=author, first_published=2000,
+                                        status=Book.Status.PUBLISHED)
+        self.users = [get_user_model().objects.create_user(f'reader{number}') for number in range(self.threads)]
+
+    def submit_reviews(self, user, barrier, errors):
+        try:
+            barrier.wait()
+            for number in range(self.rounds):
+                Review.objects.submit(self.book, user, rating=(user.pk + number) % 5 + 1, text=f'Take {number}')
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connections.close_all()
+
+    def test_concurrent_submissions_keep_the_aggregates(self):
+        barrier = threading.Barrier(self.threads)
+        errors = []
+        workers = [threading.Thread(target=self.submit_reviews, args=(user, barrier, errors)) for user in self.users]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+
+        self.book.refresh_from_db()
+        expected = Review.objects.filter(book=self.book).aggregate(
+            count=Count('pk'), total=Coalesce(Sum('rating'), 0), mean=Coalesce(Avg('rating'), 0.0),
+        )
+        self.assertEqual(expected['count'], self.threads)
+        self.assertEqual(self.book.reviews_count, expected['count'])
+        self.assertEqual(self.book.rating_sum, expected['total'])
+        self.assertAlmostEqual(self.book.rating_avg, expected['mean'])
+
+
+class ReviewAggregateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        author = Author.objects.create(name='Author', slug='author')
+        self.first, self.second = (
+            Book.objects.create(title=title, author=author, first_published=2000, status=Book.Status.PUBLISHED)
+            for title in ('First', 'Second')
+        )
+        self.user = get_user_model().objects.create_user('reader')
+
+    def test_moving_a_review_updates_both_books(self):
+        Review.objects.create(book=self.first, user=self.user, text='Good', rating=4)
+        review = Review.objects.get()
+        review.book = self.second
+        review.save()
+
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.reviews_count, self.first.rating_sum, self.first.rating_avg), (0, 0, 0.0))
+        self.assertEqual((self.second.reviews_count, self.second.rating_sum, self.second.rating_avg), (1, 4, 4.0))
+
+    def test_submit_tells_creation_from_update_within_the_same_instant(self):
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now()):
+            first = Review.objects.submit(self.first, self.user, rating=2, text='Fine')
+            second = Review.objects.submit(self.first, self.user, rating=5, text='Great')
+
+        self.assertEqual([created for review, created in (first, second)], [True, False])
+        self.assertEqual(first[0].pk, second[0].pk)
+        self.first.refresh_from_db()
+        self.assertEqual((self.first.reviews_count, self.first.rating_sum), (1, 5))
+
+
+class RenditionStorageTests(SimpleTestCase):
+    def test_renditions_of_legacy_images_keep_their_names(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            # Stored under its upload name, before the storage was content-addressed.
+            os.makedirs(os.path.join(media_root, 'images'))
+            Image.new('RGB', (40, 30)).save(os.path.join(media_root, 'images', 'legacy.jpg'), 'JPEG')
+            storage = ContentAddressedStorage()
+
+            self.assertEqual(generate_renditions('images/legacy.jpg', storage), len(list(rendition_names('x'))))
+            self.assertTrue(has_renditions('images/legacy.jpg', storage))
+            self.assertTrue(all(storage.exists(name) for name in rendition_names('images/legacy.jpg')))
+
+    def test_only_originals_are_served_immutable(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            storage = ContentAddressedStorage()
+            image = BytesIO()
+            Image.new('RGB', (40, 30)).save(image, 'PNG')
+            name = storage.save('images/cover.png', ContentFile(image.getvalue()))
+            generate_renditions(name, storage)
+            request = RequestFactory().get('/')
+
+            self.assertEqual(serve_media(request, name, media_root).headers['Cache-Control'], IMMUTABLE)
+            for rendition in rendition_names(name):
+                with self.subTest(rendition=rendition):
+                    self.assertTrue(is_content_addressed(rendition))
+                    self.assertNotIn('Cache-Control', serve_media(request, rendition, media_root).headers)
+
+
+class PerProcessCacheTests(TestCase):
+    """
+    With a per-process cache, the changes another process invalidated
+    reach the cached cards and pages after LOCAL_CACHE_MAX_TIMEOUT.
+    """
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        author = Author.objects.create(name='Author', slug='author')
+        self.book = Book.objects.create(title='Old title', slug='book', author=author, first_published=2000,
+                                        status=Book.Status.PUBLISHED)
+
+    @override_settings(LOCAL_CACHE_MAX_TIMEOUT=60, PAGE_CACHE_TIMEOUT=600, BOOK_CARD_CACHE_TIMEOUT=600)
+    def test_changes_from_other_processes_show_after_the_local_timeout(self):
+        self.assertContains(self.client.get(reverse('home')), 'Old title')
+        # Changed without the signals, as by another process whose invalidations stay in its own cache.
+        Book.objects.filter(pk=self.book.pk).update(title='New title')
+        self.assertContains(self.client.get(reverse('home')), 'Old title')
+
+        with mock.patch('time.time', return_value=time.time() + 61):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'New title')
+        self.assertNotContains(response, 'Old title')
+
+
+class AsyncViewTests(TestCase):
+    def test_default_context_looks_up_the_object_or_the_list(self):
+        author = Author.objects.create(name='Author', slug='author')
+        book = Book.objects.create(title='Book', slug='book', author=author, first_published=2000)
+
+        class AsyncDetail(AsyncConditionalGetMixin, DetailView):
+            model = Book
+
+        class AsyncList(AsyncConditionalGetMixin, ListView):
+            model = Book
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        self.assertEqual(async_to_sync(AsyncDetail.as_view())(request, slug='book').context_data['object'], book)
+        self.assertEqual(list(async_to_sync(AsyncList.as_view())(request).context_data['object_list']), [book])
+
+    def test_pages_beyond_64_bits_are_empty(self):
+        with self.assertRaises(EmptyPage):
+            async_to_sync(apaginate)(Paginator(Book.objects.order_by('pk'), 7), 10 ** 20)
+
+
+class GenreSidebarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.genre = Genre.objects.create(title='Drama', slug='drama')
+        author = Author.objects.create(name='Author', slug='author')
+        self.published, self.draft = (
+            Book.objects.create(title=title, slug=title.lower(), author=author, first_published=2000, status=status)
+            for title, status in (('Published', Book.Status.PUBLISHED), ('Draft', Book.Status.DRAFT))
+        )
+        for book in (self.published, self.draft):
+            book.genre.add(self.genre)
+
+    def book_counts(self):
+        return {genre['title']: genre['book_count'] for genre in get_genre_sidebar()}
+
+    def test_counts_published_books_and_are_served_from_the_cache(self):
+        self.assertEqual(self.book_counts(), {'Drama': 1})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.book_counts(), {'Drama': 1})
+
+    def test_changes_drop_the_cached_counts(self):
+        self.assertEqual(self.book_counts(), {'Drama': 1})
+        self.draft.status = Book.Status.PUBLISHED
+        self.draft.save()
+        self.assertEqual(self.book_counts(), {'Drama': 2})
+
+        self.published.genre.remove(self.genre)
+        self.assertEqual(self.book_counts(), {'Drama': 1})
+
+        self.genre.title = 'Theatre'
+        self.genre.save()
+        self.assertEqual(self.book_counts(), {'Theatre': 1})
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.author = Author.objects.create(name='Frank Herbert', slug='frank-herbert')
+        self.dune = Book.objects.create(title='Dune', slug='dune', author=self.author, first_published=1965,
+                                        description='A desert planet and its spice.', status=Book.Status.PUBLISHED)
+        self.dune.tags.add('classic')
+        Book.objects.create(title='Dune Draft', slug='dune-draft', author=self.author, first_published=1965)
+
+    def search(self, query):
+        response = self.client.get(reverse('search'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [book.title for book in response.context['books']]
+
+    def test_published_books_match_by_prefix_author_and_tag(self):
+        for query in ('dun', 'desert spice', 'herbert', 'classic', 'DUNE'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), ['Dune'])
+        self.assertEqual(self.search('dune missing'), [])
+
+    def test_query_syntax_is_taken_as_words(self):
+        # Every word must match, operators included.
+        for query, titles in [('"dune', ['Dune']), ('(dune*', ['Dune']), ('dune OR draft', []), ('-', [])]:
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), titles)
+
+    def test_index_follows_changes(self):
+        self.author.name = 'Frank Patrick Herbert'
+        self.author.save()
+        self.assertEqual(self.search('patrick'), ['Dune'])
+
+        self.dune.tags.remove('classic')
+        self.assertEqual(self.search('classic'), [])
+
+        self.dune.status = Book.Status.DRAFT
+        self.dune.save()
+        self.assertEqual(self.search('dune'), [])
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(name='Émile Zola', slug='emile-zola')
+        genre = Genre.objects.create(title='Novel', slug='novel')
+        for number in range(5):
+            book = Book.objects.create(title=f'Book {number}', slug=f'book-{number}', author=cls.author,
+                                       first_published=1880, status=Book.Status.PUBLISHED)
+            book.genre.add(genre)
+            book.tags.add('naturalism')
+        Book.objects.create(title='Draft', slug='draft', author=cls.author, first_published=1880)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_book_pages_follow_the_next_links_at_a_fixed_query_count(self):
+        url, slugs = f"{reverse('api:books')}?limit=2", []
+        while url:
+            # The books, then their genres and their tags.
+            with self.assertNumQueries(3):
+                data = self.client.get(url).json()
+            slugs += [book['slug'] for book in data['results']]
+            url = data['next']
+        self.assertEqual(slugs, [f'book-{number}' for number in range(5)])
+        self.assertEqual(data['results'][0]['genres'], ['novel'])
+        self.assertEqual(data['results'][0]['tags'], ['naturalism'])
+
+    def test_fields_select_the_output_and_the_queries(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(reverse('api:books'), {'fields': 'slug,author_name', 'author': 'emile-zola'}).json()
+        self.assertEqual(data['results'][0], {'slug': 'book-0', 'author_name': 'Émile Zola'})
+        response = self.client.get(reverse('api:books'), {'fields': 'slug,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+
+    def test_stream_exports_every_published_book(self):
+        response = self.client.get(reverse('api:books'), {'stream': '1', 'fields': 'slug'})
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data, [{'slug': f'book-{number}'} for number in range(5)])
+
+    def test_drafts_are_not_found(self):
+        self.assertEqual(self.client.get(reverse('api:book', kwargs={'slug': 'book-1'})).json()['title'], 'Book 1')
+        self.assertEqual(self.client.get(reverse('api:book', kwargs={'slug': 'draft'})).status_code, 404)
+
+    def test_autocomplete_matches_prefixes_ignoring_case(self):
+        Author.objects.create(name='Emily Brontë', slug='emily-bronte')
+        for query, names in [('émi', ['Émile Zola']), ('EM', ['Emily Brontë']), ('x', [])]:
+            with self.subTest(query=query):
+                response = self.client.get(reverse('api:autocomplete_authors'), {'q': query})
+                self.assertEqual([result['text'] for result in response.json()['results']], names)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.author = Author.objects.create(name='Author', slug='author')
+        self.book, self.other = (
+            Book.objects.create(title=title, slug=title.lower(), author=self.author, first_published=2000,
+                                status=Book.Status.PUBLISHED)
+            for title in ('Book', 'Other')
+        )
+        self.url = reverse('book', kwargs={'book_slug': 'book'})
+
+    def test_anonymous_pages_are_served_without_queries_until_purged(self):
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+
+        Review.objects.create(book=self.other, user=get_user_model().objects.create_user('reader'), rating=3)
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'hit')
+
+        self.book.description = 'Now with a description.'
+        self.book.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Now with a description.')
+
+    def test_visitors_with_a_session_get_fresh_pages(self):
+        self.client.get(self.url)
+        self.client.force_login(get_user_model().objects.create_user('reader'))
+        response = self.client.get(self.url)
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertNotIn('Surrogate-Key', response)
+
+
+class SimilarBooksTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        author = Author.objects.create(name='Author', slug='author')
+        novel, poetry = (Genre.objects.create(title=title, slug=title.lower()) for title in ('Novel', 'Poetry'))
+        self.books = {}
+        for title, genre, tags, status in [
+            ('Dune', novel, ['desert', 'spice'], Book.Status.PUBLISHED),
+            ('Arrakis', novel, ['desert', 'spice'], Book.Status.PUBLISHED),
+            ('Foundation', novel, [], Book.Status.PUBLISHED),
+            ('Sonnets', poetry, [], Book.Status.PUBLISHED),
+            ('Spice Draft', novel, ['spice'], Book.Status.DRAFT),
+        ]:
+            book = Book.objects.create(title=title, author=author, first_published=1965, status=status)
+            book.genre.add(genre)
+            book.tags.add(*tags)
+            self.books[title] = book
+
+    def similar_titles(self, title):
+        return [book.title for book in self.books[title].similar_books()]
+
+    def rebuild(self, *args):
+        call_command('rebuild_similar_books', *args, stdout=StringIO())
+
+    def test_published_books_sharing_the_most_come_first(self):
+        self.rebuild()
+        self.assertEqual(self.similar_titles('Dune'), ['Arrakis', 'Foundation'])
+        self.assertEqual(self.similar_titles('Sonnets'), [])
+        self.assertEqual(self.similar_titles('Spice Draft'), [])
+        self.assertContains(self.client.get(self.books['Dune'].get_absolute_url()), 'Arrakis')
+
+    def test_stale_run_refreshes_changed_books_and_their_listers(self):
+        self.rebuild()
+        self.books['Foundation'].tags.add('desert', 'spice')
+        self.books['Arrakis'].tags.clear()
+        # The changed books, and Dune, which lists them.
+        self.assertEqual(stale_book_ids(), {self.books[title].pk for title in ('Dune', 'Arrakis', 'Foundation')})
+
+        self.rebuild('--stale')
+        self.assertEqual(self.similar_titles('Dune'), ['Foundation', 'Arrakis'])
+        self.assertEqual(stale_book_ids(), set())
+
+
+class ImportCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def import_records(self, *records):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False) as f:
+            f.writelines(json.dumps(record) + '\n' for record in records)
+        self.addCleanup(os.remove, f.name)
+        stderr = StringIO()
+        call_command('import_catalog', f.name, stdout=StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def test_names_without_an_ascii_slug_are_refused(self):
+        errors = self.import_records(
+            {'title': 'War and Peace', 'author': 'Leo Tolstoy', 'status': 'published', 'genres': ['Роман']},
+            {'title': 'Solaris', 'author': 'Stanislaw Lem', 'status': 'published', 'genres': 'Фантастика, Drama'},
+            {'title': 'The Seagull', 'author': 'Anton Chekhov', 'status': 'published', 'genres': ['Drama'],
+             'tags': ['пьеса']},
+        )
+
+        self.assertIn("'Роман'", errors)
+        self.assertIn("'Фантастика'", errors)
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['The Seagull'])
+        self.assertEqual(list(Genre.objects.values_list('slug', flat=True)), ['drama'])
+        self.assertEqual(list(Book.objects.get().tags.values_list('slug', flat=True)), ['пьеса'])
+        self.assertEqual(self.client.get(reverse('about')).status_code, 200)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Author', slug='author')
+        Book.objects.bulk_create([
+            Book(title=f'Book {number}', slug=f'book-{number}', author=author, first_published=2000,
+                 status=Book.Status.PUBLISHED)
+            for number in range(10)
+        ])
+        cls.ids = list(Book.objects.values_list('pk', flat=True))
+
+    def test_pages_walk_the_listing_both_ways(self):
+        paginator = CursorPaginator(Book.objects.all(), 4)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([[book.pk for book in page] for page in pages],
+                         [self.ids[:4], self.ids[4:8], self.ids[8:]])
+        self.assertFalse(pages[0].has_previous())
+        self.assertEqual([book.pk for book in paginator.page(pages[-1].previous_cursor)], self.ids[4:8])
+
+    def test_positions_beyond_64_bits_are_invalid(self):
+        for value in (2 ** 63, -2 ** 63 - 1, 10 ** 30):
+            with self.subTest(value=value), self.assertRaises(InvalidCursor):
+                decode_cursor(encode_cursor('n', value))
+        self.assertEqual(decode_cursor(encode_cursor('p', 2 ** 63 - 1)), ('p', 2 ** 63 - 1))
+
+    @override_settings(BOOKS_CURSOR_PAGINATION=True)
+    def test_out_of_range_cursors_are_not_found(self):
+        cursor = encode_cursor('n', 10 ** 30)
+        self.assertEqual(self.client.get(reverse('home'), {'cursor': cursor}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api:books'), {'cursor': cursor}).status_code, 400)
+
+
+class MigrateMediaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write(self, name, colour):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.new('RGB', (40, 30), colour).save(path, 'PNG')
+
+    def media_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.media_root).replace(os.sep, '/')
+            for directory, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_gc_only_deletes_moved_originals_and_unreferenced_blobs(self):
+        self.write('users/default.png', 'white')
+        self.write('images/cover.png', 'red')
+        self.write('images/dropped.png', 'blue')
+        author = Author.objects.create(name='Author', slug='author')
+        Book.objects.bulk_create([
+            Book(title='Kept', slug='kept', author=author, first_published=2000, image='images/cover.png'),
+            Book(title='Dropped', slug='dropped', author=author, first_published=2000, image='images/dropped.png'),
+        ])
+        call_command('migrate_media', stdout=StringIO())
+        Book.objects.filter(slug='dropped').update(image='')
+
+        call_command('migrate_media', '--gc', '--min-age', '0', stdout=StringIO())
+
+        cover = Book.objects.get(slug='kept').image.name
+        self.assertTrue(is_content_addressed(cover))
+        self.assertEqual(self.media_files(), sorted([cover, 'users/default.png']))
@@ -1,17 +1,24 @@
+from django.conf import settings
 from django.urls import path, register_converter
 from . import views
+from . import async_views
 from . import converters
 
+# The read-only pages have async versions for when we are served through ASGI.
+read_views = async_views if settings.ASYNC_VIEWS else views
+
 
 register_converter(converters.FourDigitYearConverter, 'year4')
 
 urlpatterns = [
-    path('', views.BookHome.as_view(), name='home'),
-    path('tags/<str:tag>/', views.BookByTag.as_view(), name='books_by_tags'),
+    path('', read_views.BookHome.as_view(), name='home'),
+    path('tags/', views.TagCloud.as_view(), name='tags'),
+    path('tags/<str:tag>/', read_views.BookByTag.as_view(), name='books_by_tags'),
+    path('search/', views.SearchBooks.as_view(), name='search'),
     path('addbook/', views.AddBook.as_view(), name='add_book'),
-    path('book/<slug:book_slug>/', views.ShowBook.as_view(), name='book'),
-    path('genre/<slug:genre_slug>/', views.BookGenre.as_view(), name='genre'),
-    path('author/<slug:author_slug>/', views.ShowAuthor.as_view(), name='author'),
+    path('book/<slug:book_slug>/', read_views.ShowBook.as_view(), name='book'),
+    path('genre/<slug:genre_slug>/', read_views.BookGenre.as_view(), name='genre'),
+    path('author/<slug:author_slug>/', read_views.ShowAuthor.as_view(), name='author'),
     # path('editions/<year4:year>/', views.editions, name='editions'),
     path('about/', views.About.as_view(), name='about'),
     path('contact/', views.ContactInfo.as_view(), name='contact'),
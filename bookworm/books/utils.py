@@ -1,4 +1,24 @@
+import asyncio
+from hashlib import md5
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.paginator import InvalidPage
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.translation import gettext as _
+from django.views.generic.base import ContextMixin
+from django.views.generic.detail import SingleObjectMixin
+from django.views.generic.list import MultipleObjectMixin
+
+from .cache import get_card_versions, get_genre_sidebar_version, render_book_cards
+from .models import Book
+from .pagecache import LISTING, SIDEBAR
+from .pagination import CursorPaginator, InvalidCursor, apaginate
+
 menu = [{'title': 'About', 'url_name': 'about'},
+        {'title': 'Tags', 'url_name': 'tags'},
         {'title': 'Add Book', 'url_name': 'add_book'},
         {'title': 'Contact', 'url_name': 'contact'},
         ]
@@ -20,3 +40,275 @@ class DataMixin:
         context['genre_selected'] = None
         context.update(kwargs)
         return context
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GETs with 304 Not Modified before any page work.
+
+    Views implement get_freshness() with a cheap query. Its result is combined
+    with the viewer and the sidebar version into a weak ETag, so a page never
+    matches across users or after the sidebar changed. Requests with pending
+    flash messages always get a full response.
+
+    No Last-Modified is sent: update times miss much of what the ETag covers,
+    such as the sidebar, the viewer or a book leaving the page, and a client
+    sending only If-Modified-Since would get a stale page.
+
+    Rendered responses carry the page's surrogate keys, which let
+    AnonymousPageCacheMiddleware cache them (see pagecache.py).
+    """
+    def get_freshness(self):
+        """
+        Describe the current state of the page.
+
+        Returns:
+            tuple: Hashable parts of the state, or None to skip conditional
+            handling.
+        """
+        return None
+
+    def get_surrogate_keys(self):
+        """
+        Get the surrogate keys of the data the rendered page shows.
+
+        Returns:
+            set: The keys, or None to keep the page out of the page cache.
+        """
+        return None
+
+    def add_surrogate_keys(self, response):
+        keys = self.get_surrogate_keys()
+        if keys is not None:
+            response.surrogate_keys = set(keys) | {SIDEBAR}
+
+    def check_preconditions(self, freshness):
+        """
+        Compare the request's ETag with the current state of the page.
+
+        Returns:
+            tuple: A 304 (or 412) response, or None if the page must be
+            rendered, then the ETag to send.
+        """
+        if freshness is None:
+            return None, None
+        state = repr((freshness, self.request.user.pk, get_genre_sidebar_version()))
+        etag = f'W/"{md5(state.encode(), usedforsecurity=False).hexdigest()}"'
+        return get_conditional_response(self.request, etag=etag), etag
+
+    @staticmethod
+    def add_validators(response, etag):
+        if etag:
+            response.headers.setdefault('ETag', etag)
+
+    def get(self, request, *args, **kwargs):
+        freshness = None if has_pending_messages(request) else self.get_freshness()
+        response, etag = self.check_preconditions(freshness)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            self.add_validators(response, etag)
+            self.add_surrogate_keys(response)
+        return response
+
+
+class AsyncConditionalGetMixin(ConditionalGetMixin):
+    """
+    Coroutine version of ConditionalGetMixin for the async read views.
+
+    Views implement aget_freshness() and aget_context_data() with the async
+    ORM. The viewer is loaded up front, so that request.user can be used from
+    the event loop.
+    """
+    async def aget_freshness(self):
+        return None
+
+    async def aget_context_data(self):
+        """
+        Get the context of the rendered page. By default the object or the
+        object list is looked up and the sync get_context_data() run, as the
+        sync get() of detail and list views does, in a worker thread; views
+        that fetch their data with the async ORM override this.
+        """
+        def get_context_data():
+            if isinstance(self, SingleObjectMixin):
+                self.object = self.get_object()
+            if isinstance(self, MultipleObjectMixin):
+                self.object_list = self.get_queryset()
+            return self.get_context_data()
+
+        return await sync_to_async(get_context_data)()
+
+    async def get(self, request, *args, **kwargs):
+        await aload_user(request)
+        freshness = None
+        if not await sync_to_async(has_pending_messages)(request):
+            freshness = await self.aget_freshness()
+        response, etag = await sync_to_async(self.check_preconditions)(freshness)
+        if response is None:
+            response = self.render_to_response(await self.aget_context_data())
+            self.add_validators(response, etag)
+            self.add_surrogate_keys(response)
+        return response
+
+
+async def aload_user(request):
+    """
+    Load the lazy request.user in a worker thread, so that it can then be
+    used from async code without querying the database.
+    """
+    await sync_to_async(lambda: request.user.pk)()
+
+
+def has_pending_messages(request):
+    return bool(len(get_messages(request)))
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    """
+    Async version of get_object_or_404().
+
+    Raises:
+        Http404: If no object matches.
+    """
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+class BookListMixin(ConditionalGetMixin):
+    """
+    Shared setup of the book listing pages.
+
+    Every listing goes through Book.published.for_listing(), so a page costs
+    the same number of queries whatever the number of books on it. The cards
+    come from the fragment cache; only the missing ones are prefetched and
+    rendered.
+
+    With cursor pagination on (``cursor_pagination`` or the
+    BOOKS_CURSOR_PAGINATION setting) pages are addressed by opaque ``cursor``
+    tokens and no total count is computed.
+    """
+    template_name = 'books/index.html'
+    context_object_name = 'books'
+    paginate_by = 7
+    cursor_pagination = None
+
+    def get_listing_queryset(self):
+        return Book.published.for_listing(prefetch=False)
+
+    def uses_cursor_pagination(self):
+        if self.cursor_pagination is None:
+            return settings.BOOKS_CURSOR_PAGINATION
+        return self.cursor_pagination
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.uses_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_surrogate_keys(self):
+        return {LISTING}
+
+    def get_freshness_rows(self):
+        # The card versions change with everything a card shows, so the ids are all the page needs.
+        return self.get_queryset().values('id')
+
+    def get_freshness(self):
+        rows = self.get_freshness_rows()
+        paginator, page, rows, is_paginated = self.paginate_queryset(rows, self.paginate_by)
+        return self.describe_page(paginator, page)
+
+    def describe_page(self, paginator, page):
+        """
+        Describe the books of a page of freshness rows by their card versions,
+        which change with everything a card shows.
+        """
+        rows = list(page)
+        if not rows and not self.get_allow_empty():
+            return None
+        versions = get_card_versions([row['id'] for row in rows])
+        return (
+            tuple(versions[row['id']] for row in rows),
+            page.has_next(), page.has_previous(), getattr(paginator, 'num_pages', None),
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['book_cards'] = render_book_cards(list(context['object_list']))
+        context['cursor_pagination'] = self.uses_cursor_pagination()
+        return context
+
+
+class AsyncBookListMixin(AsyncConditionalGetMixin):
+    """
+    Async version of the BookListMixin pages, mixed in before the sync view.
+
+    The page rows and their count are fetched concurrently, and at the same
+    time as aget_page_context(), which views override for their own lookups
+    (e.g. the genre being listed).
+    """
+    async def apaginate_queryset(self, queryset):
+        """
+        Async version of paginate_queryset().
+
+        Returns:
+            tuple: The paginator and the page.
+        """
+        if self.uses_cursor_pagination():
+            paginator = CursorPaginator(queryset, self.paginate_by)
+            try:
+                return paginator, await paginator.apage(self.request.GET.get('cursor'))
+            except InvalidCursor as e:
+                raise Http404(str(e))
+
+        paginator = self.get_paginator(queryset, self.paginate_by, orphans=self.get_paginate_orphans(),
+                                       allow_empty_first_page=self.get_allow_empty())
+        number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        if number == 'last':
+            number = await sync_to_async(lambda: paginator.num_pages)()
+        try:
+            return paginator, await apaginate(paginator, number)
+        except ValueError:
+            raise Http404(_('Page is not “last”, nor can it be converted to an int.'))
+        except InvalidPage as e:
+            raise Http404(_('Invalid page (%(page_number)s): %(message)s') % {'page_number': number, 'message': str(e)})
+
+    async def aget_freshness(self):
+        paginator, page = await self.apaginate_queryset(self.get_freshness_rows())
+        return self.describe_page(paginator, page)
+
+    async def aget_page_context(self):
+        """
+        Get the page specific context, given to get_mixin_context().
+
+        Returns:
+            dict: The context, or None to keep the class defaults.
+        """
+        return None
+
+    async def aget_context_data(self):
+        (paginator, page), page_context = await asyncio.gather(
+            self.apaginate_queryset(self.get_queryset()),
+            self.aget_page_context(),
+        )
+        books = list(page.object_list)
+        self.object_list = books
+        context = ContextMixin.get_context_data(
+            self,
+            paginator=paginator,
+            page_obj=page,
+            is_paginated=page.has_other_pages(),
+            object_list=books,
+            books=books,
+            book_cards=await sync_to_async(render_book_cards)(books),
+            cursor_pagination=self.uses_cursor_pagination(),
+        )
+        if page_context is not None:
+            context = self.get_mixin_context(context, **page_context)
+        return context
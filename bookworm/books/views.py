@@ -1,35 +1,46 @@
+import math
+
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse, HttpResponseNotFound
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseNotFound
+from django.db.models import Count, Max, Min, Q, Sum
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, TemplateView
 from taggit.models import Tag
 
 from .forms import AddBookForm, ReviewForm, ContactForm
-from .models import Author, Book, Genre, Review
-from .utils import DataMixin
+from .models import Author, Book, Genre, Review, TagStat
+from .search import SearchResults, search_available
+from .cache import get_card_versions
+from .pagecache import author_key, book_key, genre_key, tag_key
+from .utils import BookListMixin, ConditionalGetMixin, DataMixin
 
 
-class BookHome(DataMixin, ListView):
-    template_name = 'books/index.html'
-    context_object_name = 'books'
+class BookHome(BookListMixin, DataMixin, ListView):
     title_page = 'All genres'
     genre_selected = 0
-    paginate_by = 7
 
     def get_queryset(self):
-        return Book.published.all()
+        return self.get_listing_queryset()
 
 
-class BookByTag(DataMixin, ListView):
-    model = Book
-    template_name = 'books/index.html'
-    context_object_name = 'books'
+class BookByTag(BookListMixin, DataMixin, ListView):
     tag = None
 
+    def get_tag(self):
+        if self.tag is None:
+            self.tag = get_object_or_404(Tag, slug=self.kwargs['tag'])
+        return self.tag
+
     def get_queryset(self):
-        self.tag = Tag.objects.get(slug=self.kwargs['tag'])
-        return Book.published.all().filter(tags__slug=self.tag.slug)
+        # Filtering by the tag's id keeps the tag table out of the listing query.
+        return self.get_listing_queryset().filter(tags__id=self.get_tag().pk)
+
+    def get_surrogate_keys(self):
+        return super().get_surrogate_keys() | {tag_key(self.tag.slug)}
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -39,38 +50,164 @@ class BookByTag(DataMixin, ListView):
         )
 
 
-class BookGenre(DataMixin, ListView):
-    template_name = 'books/index.html'
-    context_object_name = 'books'
+class TagCloud(DataMixin, ListView):
+    """
+    The most used tags, sized by their number of published books.
+
+    The counts come from TagStat, so the page is one indexed query however
+    many books are tagged.
+    """
+    template_name = 'books/tags.html'
+    context_object_name = 'tags'
+    # Font sizes of the least and the most used tag, in percent.
+    min_size = 80
+    max_size = 240
+
+    def get_queryset(self):
+        return (TagStat.objects.filter(published_count__gt=0).select_related('tag')
+                .order_by('-published_count', 'tag__name')[:settings.TAG_CLOUD_SIZE])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        return self.get_mixin_context(context, title='Tags', tags=self.weigh(context['tags']))
+
+    def weigh(self, stats):
+        """
+        Size the tags on a log scale, so that a few very popular tags do not
+        flatten all the others.
+
+        Returns:
+            list: A dict with name, slug, count and size per tag, by name.
+        """
+        stats = list(stats)
+        if not stats:
+            return []
+        low = math.log(min(stat.published_count for stat in stats))
+        spread = math.log(max(stat.published_count for stat in stats)) - low
+        return [
+            {
+                'name': stat.tag.name,
+                'slug': stat.tag.slug,
+                'count': stat.published_count,
+                'size': round(self.min_size + (self.max_size - self.min_size)
+                              * ((math.log(stat.published_count) - low) / spread if spread else 1)),
+            }
+            for stat in sorted(stats, key=lambda stat: stat.tag.name.lower())
+        ]
+
+
+class BookGenre(BookListMixin, DataMixin, ListView):
     allow_empty = False
+    genre = None
+
+    def get_queryset(self):
+        return self.get_listing_queryset().filter(genre__slug=self.kwargs['genre_slug'])
+
+    def get_surrogate_keys(self):
+        return super().get_surrogate_keys() | {genre_key(self.genre.pk)}
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        self.genre = Genre.objects.get(slug=self.kwargs['genre_slug'])
+        return self.get_mixin_context(
+            context,
+            title='Genre: ' + self.genre.title,
+            genre_selected=self.genre.pk,
+        )
+
+
+class SearchBooks(DataMixin, ListView):
+    template_name = 'books/search.html'
+    context_object_name = 'books'
+    paginate_by = 10
+    query = ''
 
     def get_queryset(self):
-        return Book.published.filter(
-            genre__slug=self.kwargs['genre_slug']).prefetch_related('genre')
+        self.query = self.request.GET.get('q', '').strip()
+        if search_available():
+            return SearchResults(self.query)
+        if not self.query:
+            return Book.published.none()
+        return Book.published.select_related('author').filter(
+            Q(title__icontains=self.query) | Q(author__name__icontains=self.query))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        genre = Genre.objects.get(slug=self.kwargs['genre_slug'])
         return self.get_mixin_context(
             context,
-            title='Genre: ' + genre.title,
-            genre_selected=genre.pk,
+            title=f'Search: {self.query}' if self.query else 'Search',
+            query=self.query,
         )
 
 
-class ShowAuthor(DataMixin, DetailView):
-    model = Author
+class ShowAuthor(BookListMixin, DataMixin, ListView):
+    """
+    An author with the stats of their published books and a paginated list
+    of book cards.
+
+    The stats come from one aggregate query over the books' stored rating
+    aggregates, so the reviews table is never read.
+    """
     template_name = 'books/author.html'
-    slug_url_kwarg = 'author_slug'
-    context_object_name = 'author'
+    author = None
+    stats = None
+
+    def get_author(self):
+        if self.author is None:
+            self.author = get_object_or_404(Author, slug=self.kwargs['author_slug'])
+        return self.author
+
+    def get_queryset(self):
+        return self.get_listing_queryset().filter(author=self.get_author())
+
+    def get_surrogate_keys(self):
+        return super().get_surrogate_keys() | {author_key(self.author.pk)}
+
+    @staticmethod
+    def stats_aggregates():
+        return {
+            'book_count': Count('pk'),
+            'review_count': Sum('reviews_count'),
+            'rating_sum': Sum('rating_sum'),
+            'first_year': Min('first_published'),
+            'latest_year': Max('first_published'),
+        }
+
+    @staticmethod
+    def describe_stats(stats):
+        """
+        Turn the aggregates into the stats shown on the page.
+
+        Returns:
+            dict: The book and review counts, the mean rating of all the
+            reviews (None without reviews), and the first and latest
+            publication years.
+        """
+        review_count = stats['review_count'] or 0
+        rating_sum = stats.pop('rating_sum') or 0
+        return dict(stats, review_count=review_count, mean_rating=rating_sum / review_count if review_count else None)
+
+    def get_author_stats(self):
+        if self.stats is None:
+            queryset = Book.published.filter(author=self.get_author())
+            self.stats = self.describe_stats(queryset.aggregate(**self.stats_aggregates()))
+        return self.stats
+
+    def get_freshness(self):
+        return self.describe_author_page(super().get_freshness(), self.get_author_stats())
+
+    def describe_author_page(self, freshness, stats):
+        if freshness is None:
+            return None
+        return freshness, self.author.pk, self.author.time_update, tuple(stats.values())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        books = Book.published.filter(author=context['author'])
         return self.get_mixin_context(
             context,
-            title=context['author'].name,
-            books=books
+            title=self.author.name,
+            author=self.author,
+            stats=self.get_author_stats(),
         )
 
 
@@ -81,18 +218,36 @@ class ShowAuthor(DataMixin, DetailView):
 #     return HttpResponse(f'Edition year: {year}')
 
 
-class ShowBook(DataMixin, DetailView):
+class ShowBook(ConditionalGetMixin, DataMixin, DetailView):
     template_name = 'books/book.html'
     slug_url_kwarg = 'book_slug'
     context_object_name = 'book'
 
+    def get_freshness_queryset(self):
+        return Book.published.filter(slug=self.kwargs[self.slug_url_kwarg]).values(
+            'pk', 'time_update', 'author__time_update', 'reviews_count', 'rating_sum', 'similar_updated',
+        ).annotate(reviews_updated=Max('reviews__time_update'))
+
+    def get_freshness(self):
+        return self.describe_freshness(get_object_or_404(self.get_freshness_queryset()))
+
+    def get_surrogate_keys(self):
+        similar_ids = [book.pk for book in self.similar_books]
+        return {book_key(book_id) for book_id in [self.object.pk] + similar_ids} | {author_key(self.object.author_id)}
+
+    @staticmethod
+    def describe_freshness(book):
+        return tuple(book.values()) + (get_card_versions([book['pk']])[book['pk']],)
+
     def get_context_data(self, **kwargs):
+        kwargs.setdefault('reviews', Review.objects.filter(book=self.object).select_related('user'))
+        if 'similar_books' not in kwargs:
+            kwargs['similar_books'] = list(self.object.similar_books())
+        self.similar_books = kwargs['similar_books']
         context = super().get_context_data(**kwargs)
-        reviews = Review.objects.filter(book=self.object)
         return self.get_mixin_context(
             context,
             title=context['book'].title,
-            reviews=reviews,
             book=context['book'],
             form=ReviewForm(),
             )
@@ -101,12 +256,19 @@ class ShowBook(DataMixin, DetailView):
         return get_object_or_404(Book.published, slug=self.kwargs[self.slug_url_kwarg])
 
     def post(self, request, *args, **kwargs):
-        review = Review(text=request.POST.get('text'),
-                        rating=request.POST.get('rating'),
-                        user=self.request.user,
-                        book=self.get_object())
-        review.save()
-        return self.get(self, request, *args, **kwargs)
+        book = get_object_or_404(Book.published.only('pk', 'slug'), slug=self.kwargs[self.slug_url_kwarg])
+        if not request.user.is_authenticated:
+            return redirect_to_login(book.get_absolute_url())
+        form = ReviewForm(request.POST)
+        if form.is_valid():
+            review, created = Review.objects.submit(book, request.user, **form.cleaned_data)
+            if created:
+                messages.success(request, 'Thank you, your review has been added.')
+            else:
+                messages.success(request, 'You had already reviewed this book, so your review has been updated.')
+        else:
+            messages.error(request, 'Your review was not saved: please choose a rating and write a comment.')
+        return redirect(book)
 
 
 class AddBook(LoginRequiredMixin, DataMixin, CreateView):
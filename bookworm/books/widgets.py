@@ -0,0 +1,64 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
+from taggit.forms import TagWidget
+
+
+class AutocompleteUrlMixin:
+    """
+    Point books/js/autocomplete.js at the JSON endpoint named ``url``, which
+    suggests values as the user types.
+    """
+    def __init__(self, url, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+
+    class Media:
+        js = ['books/js/autocomplete.js']
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocomplete-url'] = reverse_lazy(self.url)
+        return attrs
+
+
+class AutocompleteChoicesMixin(AutocompleteUrlMixin):
+    """
+    A select of a model choice field that only renders its selected
+    options, looked up by id; the others are searched for through the
+    endpoint, so the page does not carry the whole table.
+    """
+    def optgroups(self, name, value, attrs=None):
+        options = []
+        if not self.allow_multiple_selected:
+            options.append(self.create_option(name, '', '', False, 0))
+        field = self.choices.field
+        pk_field = field.queryset.model._meta.pk
+        selected = []
+        for v in value:
+            # A form submitted with values that are not ids is rendered again with the valid ones.
+            try:
+                selected.append(pk_field.to_python(v))
+            except ValidationError:
+                pass
+        objects = field.queryset.filter(pk__in=selected) if selected else []
+        for obj in objects:
+            options.append(self.create_option(name, field.prepare_value(obj), field.label_from_instance(obj), True,
+                                              len(options)))
+        return [(None, options, 0)]
+
+
+class AutocompleteSelect(AutocompleteChoicesMixin, forms.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteChoicesMixin, forms.SelectMultiple):
+    pass
+
+
+class TagAutocompleteInput(AutocompleteUrlMixin, TagWidget):
+    """The comma-separated tags input, suggesting existing tags for the one being typed."""
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['autocomplete'] = 'off'
+        return attrs
@@ -0,0 +1,134 @@
+"""
+Database routing between the primary and its read replicas, and the
+SQLite connection profile.
+
+Reads go to a replica only inside a GET or HEAD request to the public site
+that PrimaryReplicaMiddleware has marked as such; everything else (writes,
+sessions, the admin, management commands, reads after a write) uses the
+primary. A request that writes pins its client to the primary for
+DATABASE_PRIMARY_PIN_SECONDS with a cookie, so the user sees their own
+changes while the replicas catch up.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.urls import reverse
+
+PRIMARY = 'default'
+PIN_COOKIE = 'db_primary'
+# Apps whose reads never go to a replica. A session missing from a lagging
+# replica would otherwise log its user out.
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_request_state = ContextVar('db_request_state', default=None)
+
+
+class RequestState:
+    """
+    What the router knows about the current request.
+
+    The middleware puts it in a context variable; it is mutated rather than
+    replaced, so that writes made in a copied context (e.g. in sync_to_async)
+    are still seen by the middleware.
+
+    Attributes:
+        use_replicas (bool): Whether reads may go to a replica.
+        wrote (bool): Whether the request has written to the primary.
+    """
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+class PrimaryReplicaRouter:
+    """Send writes to the primary and the reads of public pages to a random replica."""
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or not state.use_replicas or state.wrote or not settings.DATABASE_REPLICAS:
+            return PRIMARY
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return PRIMARY
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary and get its schema with its data.
+        return db not in settings.DATABASE_REPLICAS
+
+
+class PrimaryReplicaMiddleware:
+    """
+    Let the public GET and HEAD requests read from the replicas, and pin
+    clients to the primary for a while after they write.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RequestState(self.may_use_replicas(request))
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.process_response(state, response)
+
+    async def __acall__(self, request):
+        state = RequestState(self.may_use_replicas(request))
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.process_response(state, response)
+
+    @staticmethod
+    def may_use_replicas(request):
+        return (
+            request.method in ('GET', 'HEAD')
+            and PIN_COOKIE not in request.COOKIES
+            and not request.path_info.startswith(reverse('admin:index'))
+        )
+
+    @staticmethod
+    def process_response(state, response):
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.DATABASE_PRIMARY_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Apply the SQLITE_PRAGMAS profile to every new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(settings.SQLITE_PRAGMAS)
+    if connection.alias in settings.DATABASE_REPLICAS:
+        pragmas['query_only'] = 'on'
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
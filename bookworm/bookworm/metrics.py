@@ -0,0 +1,245 @@
+"""
+Per-request performance instrumentation.
+
+TimingMiddleware measures each request: total time, view time, template
+render time and the database queries, plus any sections timed with
+timed(). It sends them to the browser in a Server-Timing header and adds
+them to in-process histograms per URL name, which metrics_view exposes in
+the Prometheus text format. Each process keeps its own histograms.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+# Upper bounds of the histogram buckets, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Upper bounds of the query count buckets.
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+UNMATCHED = 'unmatched'
+
+_current_timing = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """
+    The measurements of one request.
+
+    Attributes:
+        queries (int): Number of database queries.
+        db (float): Time spent in the database, in seconds.
+        sections (dict): Time of each timed() section, in seconds.
+        render (float): Template render time, in seconds.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.sections = defaultdict(float)
+        self.render = 0.0
+        self._render_started = None
+
+    def server_timing(self, total, view):
+        """
+        Format the measurements as a Server-Timing header value.
+
+        Returns:
+            str: The header value.
+        """
+        metrics = [
+            f'total;dur={total * 1000:.1f}',
+            f'view;dur={view * 1000:.1f}',
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'render;dur={self.render * 1000:.1f}',
+        ]
+        metrics += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.sections.items()]
+        return ', '.join(metrics)
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label value, safe to update from several threads."""
+    def __init__(self, name, documentation, buckets, label='route'):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            counts, total = self._series.get(label_value, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._series[label_value] = (counts, total + value)
+
+    def expose(self):
+        """
+        Render the histogram in the Prometheus text format.
+
+        Returns:
+            list: The lines.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {label_value: (list(counts), total) for label_value, (counts, total) in self._series.items()}
+        for label_value, (counts, total) in sorted(series.items()):
+            label = f'{self.label}="{escape_label(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {cumulative}')
+        return lines
+
+
+REQUEST_DURATION = Histogram('bookworm_request_duration_seconds', 'Total time of a request.', BUCKETS)
+VIEW_DURATION = Histogram('bookworm_view_duration_seconds', 'Time of a request outside template rendering.', BUCKETS)
+RENDER_DURATION = Histogram('bookworm_render_duration_seconds', 'Template render time of a request.', BUCKETS)
+DB_DURATION = Histogram('bookworm_db_duration_seconds', 'Database time of a request.', BUCKETS)
+DB_QUERIES = Histogram('bookworm_db_queries', 'Database queries of a request.', QUERY_BUCKETS)
+SECTION_DURATION = Histogram('bookworm_section_duration_seconds', 'Time of the timed sections of a request '
+                                                                  '(context processors, template tags).',
+                             BUCKETS, label='section')
+HISTOGRAMS = (REQUEST_DURATION, VIEW_DURATION, RENDER_DURATION, DB_DURATION, DB_QUERIES, SECTION_DURATION)
+
+
+def escape_label(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def timed(name):
+    """
+    Decorate a function to add its run time to the current request's
+    measurements under ``name``. Calls outside a request are not measured.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            timing = _current_timing.get()
+            if timing is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timing.sections[name] += time.perf_counter() - started
+        return wrapper
+    return decorator
+
+
+def record_query(execute, sql, params, many, context):
+    timing = _current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.db += time.perf_counter() - started
+        timing.queries += 1
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimingMiddleware:
+    """
+    Measure every request, send the measurements in a Server-Timing header
+    and add them to the histograms. Put it first, so that it also measures
+    the other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        # Connections opened before the middleware was loaded missed connection_created.
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(sender=None, connection=connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        return self.finish(request, response, timing, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        return self.finish(request, response, timing, time.perf_counter() - started)
+
+    def process_template_response(self, request, response):
+        # Called right before the response is rendered; the callback runs right after.
+        timing = _current_timing.get()
+        if timing is not None:
+            timing._render_started = time.perf_counter()
+
+            def rendered(response):
+                timing.render += time.perf_counter() - timing._render_started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def finish(request, response, timing, total):
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else UNMATCHED
+        view = max(total - timing.render, 0)
+        response.headers.setdefault('Server-Timing', timing.server_timing(total, view))
+
+        REQUEST_DURATION.observe(route, total)
+        VIEW_DURATION.observe(route, view)
+        RENDER_DURATION.observe(route, timing.render)
+        DB_DURATION.observe(route, timing.db)
+        DB_QUERIES.observe(route, timing.queries)
+        for name, seconds in timing.sections.items():
+            SECTION_DURATION.observe(name, seconds)
+        return response
+
+
+def can_read_metrics(request):
+    """
+    Tell whether a request may read the metrics: staff users, requests with
+    the METRICS_TOKEN bearer token, and clients in METRICS_ALLOWED_IPS.
+    """
+    if request.user.is_staff or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return bool(settings.METRICS_TOKEN) and scheme.lower() == 'bearer' and hmac.compare_digest(
+        token.strip().encode(), settings.METRICS_TOKEN.encode(),
+    )
+
+
+def metrics_view(request):
+    """Expose the histograms in the Prometheus text format to the requests can_read_metrics() allows."""
+    if not can_read_metrics(request):
+        raise PermissionDenied
+    lines = [line for histogram in HISTOGRAMS for line in histogram.expose()]
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,228 @@
+"""
+Token-bucket rate limiting of the write and login endpoints.
+
+A limit such as '10/m' is a bucket of 10 tokens that refills at 10 tokens a
+minute, so a client can send a burst of 10 requests and then keeps the
+average rate. Each limited request takes a token from the bucket of its
+client IP and, for logged-in users, from the bucket of its user; when one
+is empty it is refused with a 429 and a Retry-After header telling when
+the next token is due.
+
+RATELIMITS configures the limits per URL name, and RateLimitMiddleware
+applies them; ratelimit() decorates a single view instead. The buckets are
+kept by RATELIMIT_STORE: LocalBucketStore keeps them in the process, for a
+few microseconds a request, and CacheBucketStore keeps them in the default
+cache, so that the workers that share it share the buckets.
+"""
+import math
+import threading
+import time
+from functools import cache as memoize, wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+BUCKET_KEY = 'ratelimit:{}'
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+# Only the requests that change something are limited unless a limit says otherwise.
+DEFAULT_METHODS = ('POST',)
+
+
+@memoize
+def parse_rate(rate):
+    """
+    Parse a rate such as '10/m': a number of requests per second, minute,
+    hour or day.
+
+    Returns:
+        tuple: The bucket capacity and the seconds it takes to refill.
+    """
+    count, _, period = rate.partition('/')
+    return int(count), PERIODS[period]
+
+
+def take_token(tokens, elapsed, capacity, period):
+    """
+    Refill a bucket for the time elapsed since it was last used and take a
+    token from it.
+
+    Returns:
+        tuple: The tokens left, and the seconds until a token is available
+        if the bucket was empty, or 0.
+    """
+    tokens = min(capacity, tokens + elapsed * capacity / period)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) * period / capacity
+
+
+class LocalBucketStore:
+    """
+    Keep the buckets in the memory of the process. Each worker counts on its
+    own, so with several workers a client gets up to that many times the
+    configured rate.
+
+    The least recently used buckets are dropped beyond ``max_buckets``; a
+    dropped bucket starts full again.
+    """
+    def __init__(self, max_buckets=100_000):
+        self.max_buckets = max_buckets
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, period):
+        """
+        Take a token from a bucket.
+
+        Returns:
+            float: The seconds until a token is available if there was none, or 0.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, used = self._buckets.pop(key, (capacity, now))
+            tokens, wait = take_token(tokens, now - used, capacity, period)
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_buckets:
+                del self._buckets[next(iter(self._buckets))]
+        return wait
+
+
+class CacheBucketStore:
+    """
+    Keep the buckets in the default cache, shared by every worker that uses
+    it. The update is not atomic, so two requests of the same client that
+    arrive together may both get its last token.
+    """
+    def consume(self, key, capacity, period):
+        now = time.time()
+        cache_key = BUCKET_KEY.format(key)
+        tokens, used = cache.get(cache_key, (capacity, now))
+        tokens, wait = take_token(tokens, now - used, capacity, period)
+        # A bucket left alone for a whole period is full again, like a missing one.
+        cache.set(cache_key, (tokens, now), timeout=period)
+        return wait
+
+
+@memoize
+def get_store():
+    return import_string(settings.RATELIMIT_STORE)()
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    if setting == 'RATELIMIT_STORE':
+        get_store.cache_clear()
+
+
+def check_rate_limit(request, scope, limits):
+    """
+    Take a token from each bucket of a request: the one of its client IP for
+    the ``ip`` limit, and the one of its user for the ``user`` limit if the
+    user is logged in. Behind a proxy, REMOTE_ADDR must be the client's.
+
+    Returns:
+        float: The seconds until the request would be allowed if it is
+        refused, or 0.
+    """
+    store = get_store()
+    if limits.get('ip'):
+        wait = store.consume(f"{scope}:ip:{request.META.get('REMOTE_ADDR', '')}", *parse_rate(limits['ip']))
+        if wait:
+            return wait
+    if limits.get('user') and request.user.is_authenticated:
+        return store.consume(f'{scope}:user:{request.user.pk}', *parse_rate(limits['user']))
+    return 0.0
+
+
+def too_many_requests(wait):
+    response = HttpResponse('Too many requests, please try again later.\n', status=429,
+                            content_type='text/plain; charset=utf-8')
+    response.headers['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+def ratelimit(scope, ip=None, user=None, methods=DEFAULT_METHODS):
+    """
+    Decorate a view, sync or async, to rate limit it with the buckets of
+    ``scope``, which views can share.
+
+    Args:
+        scope (str): Name of the buckets.
+        ip (str): Rate per client IP, e.g. '10/m'.
+        user (str): Rate per logged-in user.
+        methods (tuple): The HTTP methods that are limited.
+    """
+    limits = {'ip': ip, 'user': user}
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method in methods:
+                    wait = await sync_to_async(check_rate_limit)(request, scope, limits)
+                    if wait:
+                        return too_many_requests(wait)
+                return await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method in methods:
+                    wait = check_rate_limit(request, scope, limits)
+                    if wait:
+                        return too_many_requests(wait)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RateLimitMiddleware:
+    """
+    Rate limit the views named in RATELIMITS, whose limits are dicts with an
+    ``ip`` and/or a ``user`` rate and optionally the ``methods`` they apply
+    to. Put it after AuthenticationMiddleware, so that per-user limits see
+    the user.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+            # Only the limited requests need a thread, to load the user.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    @staticmethod
+    def get_limits(request):
+        view_name = request.resolver_match.view_name
+        limits = settings.RATELIMITS.get(view_name)
+        if limits is None or request.method not in limits.get('methods', DEFAULT_METHODS):
+            return None, None
+        return view_name, limits
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        scope, limits = self.get_limits(request)
+        if limits is None:
+            return None
+        wait = check_rate_limit(request, scope, limits)
+        return too_many_requests(wait) if wait else None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        scope, limits = self.get_limits(request)
+        if limits is None:
+            return None
+        wait = await sync_to_async(check_rate_limit)(request, scope, limits)
+        return too_many_requests(wait) if wait else None
@@ -32,11 +32,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bookworm.metrics.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'books.pagecache.AnonymousPageCacheMiddleware',
+    'bookworm.db.PrimaryReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'bookworm.ratelimit.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -72,9 +76,111 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than the in-memory default, whose shared cache fails concurrent writers with
+        # "table is locked" instead of making them wait, so tests see the locking of the real database.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Read replicas of the default database, e.g. copies kept up to date by the deployment
+# (or by manage.py sync_sqlite_replicas). BOOKWORM_DB_REPLICAS lists their files, comma separated.
+DATABASE_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get('BOOKWORM_DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['bookworm.db.PrimaryReplicaRouter']
+
+# How long a client keeps reading from the primary after it wrote something.
+DATABASE_PRIMARY_PIN_SECONDS = 10
+
+# Applied to every new SQLite connection. WAL lets the readers go on while a write is
+# in progress, and busy_timeout makes writers wait for each other instead of failing.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# LocMemCache is local to each process: with several workers, or for the invalidations done by management
+# commands and the book_card_stats counters to reach the workers, use a shared backend such as Redis or
+# Memcached; until then the cards, pages and counters below last at most LOCAL_CACHE_MAX_TIMEOUT. Each book
+# card takes two entries (its version and its fragment), so MAX_ENTRIES must hold two per book of the
+# catalogue plus the pages and users; past it a third of the entries is culled at random.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    }
+}
+
+# Longest lifetime of what other processes may have to invalidate, when the default cache is per-process.
+LOCAL_CACHE_MAX_TIMEOUT = 60 * 5
+
+# Lifetime of a rendered book card; cards are also dropped as soon as the book changes.
+BOOK_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Lifetime of the cached genre sidebar. It is dropped whenever genres or published books change, so this
+# only bounds how long a missed invalidation, e.g. from another process's cache, can last.
+GENRE_SIDEBAR_CACHE_TIMEOUT = 60 * 60
+
+# Lifetime of the cached profile counters. They are dropped when a book or review changes, but a
+# book moved to another user is only recounted for its new user, so they also expire.
+USER_ACTIVITY_CACHE_TIMEOUT = 60 * 60
+
+# Paginate the book listings with next/previous cursors instead of page numbers.
+BOOKS_CURSOR_PAGINATION = False
+
+# Lifetime of the cached anonymous pages; they are also purged as soon as what they show changes.
+# 0 turns the page cache off.
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Token-bucket limits of the requests to these URL names (see bookworm/ratelimit.py): a rate per client
+# IP and/or per logged-in user, like '10/m' for a burst of 10 and then 10 a minute. Only POSTs are limited
+# unless 'methods' says otherwise.
+RATELIMITS = {
+    'book': {'ip': '30/m', 'user': '10/m'},
+    'add_book': {'ip': '30/h', 'user': '20/h'},
+    'contact': {'ip': '5/h'},
+    'users:login': {'ip': '10/m'},
+    'users:signin': {'ip': '5/h'},
+    'users:password_reset': {'ip': '5/h'},
+}
+# Where the buckets are kept: in each process, or with 'bookworm.ratelimit.CacheBucketStore' in the
+# default cache, so that the workers sharing it share the limits.
+RATELIMIT_STORE = 'bookworm.ratelimit.LocalBucketStore'
+
+# Number of tags shown on the tag cloud page, the most used first.
+TAG_CLOUD_SIZE = 100
+
+# Serve the read-only pages with their async implementations, so that under ASGI they run on the event loop
+# instead of a worker thread. Turn it on for ASGI deployments, or with BOOKWORM_ASYNC_VIEWS=1.
+ASYNC_VIEWS = os.environ.get('BOOKWORM_ASYNC_VIEWS') == '1'
+
+# Who may read /metrics besides staff users: scrapers sending 'Authorization: Bearer <METRICS_TOKEN>',
+# and the clients whose REMOTE_ADDR is listed. Behind a reverse proxy on the same host every client
+# comes from 127.0.0.1, so only list the addresses that reach the server directly.
+METRICS_TOKEN = os.environ.get('BOOKWORM_METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = []
+
+
+# JSON API
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+API_STREAM_CHUNK_SIZE = 2000
+# Suggestions returned by the autocomplete endpoints, and how long browsers may cache them.
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_AGE = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -115,6 +221,21 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are stored under their content hash (see bookworm/storage.py), so that identical files are
+# stored once and media can be cached forever.
+STORAGES = {
+    'default': {
+        'BACKEND': 'bookworm.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Widths of the resized copies made of covers, author photos and avatars, smallest first.
+IMAGE_RENDITION_WIDTHS = (100, 250, 500, 1000)
+IMAGE_RENDITION_WORKERS = 2
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -126,10 +247,14 @@ LOGOUT_REDIRECT_URL = 'home'
 LOGIN_URL = 'users:login'
 
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
+    'users.authentication.CachedModelBackend',
     'users.authentication.EmailAuthBackend',
 ]
 
+# Lifetime of the cached users of authenticated requests; they are also dropped when saved, but only from the
+# cache of the process that saves them, so several workers need a shared cache backend.
+AUTH_USER_CACHE_TIMEOUT = 60
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 
 EMAIL_HOST = 'smtp.yandex.ru'
@@ -0,0 +1,91 @@
+"""
+Content-addressed media storage.
+
+ContentAddressedStorage stores every upload under the SHA-256 of its
+content, in the directory it was uploaded to: a cover uploaded as
+'images/dune.jpg' is stored as 'images/3f/3fa9…e1.jpg'. Uploading the same
+file again reuses the stored blob instead of writing a copy, and a name
+always refers to the same bytes, so serve_media() can let browsers cache
+the files forever.
+
+Files whose name is already a content hash are saved under their own
+name, and so are the renditions (see books/images.py): they are derived
+from an image and looked up by a name made from the image's, such as
+'renditions/images/3f/3fa9…e1_250w.webp', or 'renditions/images/dune_250w.webp'
+for an image stored before the storage was content-addressed. A
+rendition can be regenerated under the same name (build_renditions
+--force), so only the originals are cached forever. Blobs are
+shared between rows and never deleted when a row changes; manage.py
+migrate_media --gc deletes the ones nothing refers to.
+"""
+import hashlib
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.views.static import serve
+
+from books.images import RENDITIONS_DIR
+
+# A hash in the directory named after its first two digits, optionally followed by a suffix.
+HASHED_NAME_RE = re.compile(r'(?:^|/)([0-9a-f]{2})/\1[0-9a-f]{62}(?:[_.][^/]*)?$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def is_content_addressed(name):
+    return bool(HASHED_NAME_RE.search(name))
+
+
+def is_rendition(name):
+    return name.startswith(f'{RENDITIONS_DIR}/')
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Store uploads under their content hash, writing each distinct content
+    once. Renditions keep the name they are saved with.
+    """
+    def hashed_name(self, name, content):
+        """
+        Get the content-addressed name of a file: its directory, the first
+        two digits of its hash, then the hash and its lowercased extension.
+
+        Returns:
+            str: The storage name.
+        """
+        directory, basename = posixpath.split(name)
+        digest = content_hash(content)
+        return posixpath.join(directory, digest[:2], digest + posixpath.splitext(basename)[1].lower())
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = name.replace('\\', '/')
+        if not is_content_addressed(name) and not is_rendition(name):
+            name = self.hashed_name(name, content)
+            if self.exists(name):
+                return name
+        return super().save(name, content, max_length=max_length)
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Serve a media file like django.views.static.serve, and let it be cached
+    forever if it is a content-addressed original; renditions are left to
+    Last-Modified revalidation. Web servers serving MEDIA_ROOT should send
+    the same Cache-Control for these names.
+    """
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if is_content_addressed(path) and not is_rendition(path):
+        response.headers['Cache-Control'] = IMMUTABLE
+    return response
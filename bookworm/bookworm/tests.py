@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .ratelimit import CacheBucketStore, take_token
+
+
+@override_settings(METRICS_TOKEN='scraper-token', METRICS_ALLOWED_IPS=[])
+class MetricsAccessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_local_requests_need_a_token_or_staff(self):
+        # The test client comes from 127.0.0.1, like every request behind a reverse proxy on the same host.
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        for authorization in ('Bearer wrong', 'Basic scraper-token', 'Bearer '):
+            with self.subTest(authorization=authorization):
+                self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION=authorization).status_code,
+                                 403)
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scraper-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE', response.content.decode())
+
+        self.client.force_login(get_user_model().objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_listed_addresses_need_nothing_else(self):
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 200)
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_no_token_is_accepted_without_one_configured(self):
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+
+class TakeTokenTests(SimpleTestCase):
+    def test_buckets_refill_with_time_up_to_their_capacity(self):
+        self.assertEqual(take_token(3, 0, capacity=3, period=60), (2, 0))
+        self.assertEqual(take_token(0.5, 0, capacity=3, period=60), (0.5, 10))
+        self.assertEqual(take_token(0, 20, capacity=3, period=60), (0, 0))
+        self.assertEqual(take_token(1, 3600, capacity=3, period=60), (2, 0))
+
+
+@override_settings(RATELIMITS={'users:login': {'ip': '2/m'}}, RATELIMIT_STORE='bookworm.ratelimit.LocalBucketStore')
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def login(self, **extra):
+        return self.client.post(reverse('users:login'), {'username': 'reader', 'password': 'wrong'}, **extra)
+
+    def test_a_client_past_its_burst_waits_for_the_next_token(self):
+        now = 1000.0
+        with mock.patch('time.monotonic', side_effect=lambda: now):
+            self.assertEqual([self.login().status_code for _ in range(2)], [200, 200])
+            response = self.login()
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '30')
+
+            # Other clients and other methods are not limited.
+            self.assertEqual(self.login(REMOTE_ADDR='10.0.0.7').status_code, 200)
+            self.assertEqual(self.client.get(reverse('users:login')).status_code, 200)
+
+            now += 30
+            self.assertEqual(self.login().status_code, 200)
+            self.assertEqual(self.login().status_code, 429)
+
+    def test_cache_store_shares_the_buckets(self):
+        first, second = CacheBucketStore(), CacheBucketStore()
+        self.assertEqual(first.consume('scope:ip:1', 1, 60), 0)
+        self.assertGreater(second.consume('scope:ip:1', 1, 60), 59)
@@ -5,11 +5,15 @@ from django.urls import include, path
 from books.views import page_not_found
 
 from . import settings
+from .metrics import metrics_view
+from .storage import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('books.urls')),
     path('auth/', include('users.urls', namespace='users')),
+    path('api/v1/', include('books.api.urls', namespace='api')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 handler404 = page_not_found
@@ -17,5 +21,5 @@ handler404 = page_not_found
 if settings.DEBUG:
 
     urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
+        settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT
     )
@@ -0,0 +1,68 @@
+"""
+The activity feed of a user's profile: the books they added and the
+reviews they wrote, newest first.
+
+A page of the feed is one UNION query over both tables that only returns
+the kind, id and time of each entry, followed by one query per kind for
+the objects on the page, so it costs the same however active the user is.
+"""
+from django.db.models import CharField, F, Value
+
+from books.models import Book, Review
+
+BOOK = 'book'
+REVIEW = 'review'
+
+
+def activity_rows(user_id):
+    """
+    Get the feed entries of a user, newest first.
+
+    Returns:
+        QuerySet: (kind, id, time) tuples.
+    """
+    books = Book.published.filter(user_id=user_id).annotate(
+        kind=Value(BOOK, output_field=CharField()), time=F('time_create'),
+    ).values_list('kind', 'pk', 'time').order_by()
+    reviews = Review.objects.filter(user_id=user_id).annotate(
+        kind=Value(REVIEW, output_field=CharField()), time=F('time_create'),
+    ).values_list('kind', 'pk', 'time').order_by()
+    return books.union(reviews, all=True).order_by('-time', '-pk')
+
+
+def activity_querysets(rows):
+    """
+    Get the querysets that load the objects of some feed entries.
+
+    Returns:
+        tuple: The books and the reviews querysets.
+    """
+    books = Book.published.filter(pk__in=[pk for kind, pk, time in rows if kind == BOOK])
+    reviews = Review.objects.filter(pk__in=[pk for kind, pk, time in rows if kind == REVIEW]).select_related('book')
+    return books, reviews
+
+
+def merge_activity(rows, books, reviews):
+    """
+    Put the loaded objects back in feed order.
+
+    Returns:
+        list: A dict with kind, time and the book or review per entry.
+    """
+    objects = {BOOK: {book.pk: book for book in books}, REVIEW: {review.pk: review for review in reviews}}
+    return [
+        {'kind': kind, 'time': time, kind: objects[kind][pk]}
+        for kind, pk, time in rows if pk in objects[kind]
+    ]
+
+
+def load_activity(rows):
+    """
+    Load the objects of some feed entries, with one query per kind.
+
+    Returns:
+        list: The entries, as merge_activity() gives them.
+    """
+    rows = list(rows)
+    books, reviews = activity_querysets(rows)
+    return merge_activity(rows, books, reviews)
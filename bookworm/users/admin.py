@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.utils.safestring import mark_safe
 
+from books.images import rendition_url
+
 from .models import User
 
 
@@ -8,12 +10,11 @@ from .models import User
 class UserAdmin(admin.ModelAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'get_html_avatar', 'date_birth', 'is_staff')
     list_display_links = ('username', )
+    search_fields = ('username', 'email', 'first_name', 'last_name')
 
     def get_html_avatar(self, object):
         if object.avatar:
-            return mark_safe(f"<img src='{object.avatar.url}' width=50>")
+            return mark_safe(f"<img src='{rendition_url(object.avatar, 100)}' width=50>")
         return 'No avatar'
 
     get_html_avatar.short_description = "Avatar miniature"
-
-
@@ -0,0 +1,31 @@
+"""
+Async versions of the read-only user pages, routed instead of the views of
+the same name in views.py when the ASYNC_VIEWS setting is on.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from books.cache import get_user_activity_counts
+from books.pagination import alist
+from books.utils import aget_object_or_404, aload_user
+
+from . import views
+from .activity import activity_querysets, merge_activity
+
+
+class ProfileUser(views.ProfileUser):
+    async def get(self, request, *args, **kwargs):
+        await aload_user(request)
+        pk = self.kwargs[self.pk_url_kwarg]
+        self.object, counts = await asyncio.gather(
+            aget_object_or_404(self.model.objects, pk=pk),
+            sync_to_async(get_user_activity_counts)(pk),
+        )
+        paginator = self.get_paginator(counts)
+        page = self.get_page(paginator)
+        rows = await alist(page.object_list)
+        books, reviews = await asyncio.gather(*(alist(queryset) for queryset in activity_querysets(rows)))
+        return self.render_to_response(self.get_context_data(
+            counts=counts, paginator=paginator, page_obj=page, activity=merge_activity(rows, books, reviews),
+        ))
@@ -1,21 +1,110 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.contrib.auth.backends import BaseBackend
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import router
+from django.db.models import Case, Q, When
+from django.db.models.functions import Lower
 
+USER_KEY = 'auth_user_fields:{}'
 
-class EmailAuthBackend(BaseBackend):
+
+def user_to_cache(user):
+    """
+    Get what is cached of a user: the values of its fields but the password
+    hash, which stays out of the cache, and the session hashes derived from
+    it, which are all that authenticated requests need of it.
+
+    Returns:
+        tuple: The field values by attribute name, and the session hashes
+        with the current secret then the fallback ones.
+    """
+    fields = {
+        field.attname: field.get_prep_value(field.value_from_object(user))
+        for field in user._meta.concrete_fields if field.attname != 'password'
+    }
+    return fields, [user.get_session_auth_hash(), *user.get_session_auth_fallback_hash()]
+
+
+def user_from_cache(entry):
+    """
+    Rebuild a cached user. Its password is deferred, so that reading it
+    loads it from the database, and saving the user leaves it untouched.
+    """
+    fields, session_hashes = entry
+    user_model = get_user_model()
+    user = user_model.from_db(router.db_for_read(user_model), list(fields), list(fields.values()))
+    user._session_auth_hashes = session_hashes
+    return user
+
+
+class CachedUserMixin:
+    """
+    Serve the user of authenticated requests from the cache.
+
+    Users are cached for AUTH_USER_CACHE_TIMEOUT seconds, without their
+    password hash, and dropped as soon as they are saved or deleted (see
+    signals.py), which includes password changes and logins. Only the
+    cache of the process that saves a user drops it: with a per-process
+    cache such as LocMemCache, the other workers keep serving the old user
+    until it expires, so several workers need a shared cache.
+    """
+    def get_user(self, user_id):
+        key = USER_KEY.format(user_id)
+        entry = cache.get(key)
+        if entry is not None:
+            return user_from_cache(entry)
+        user = super().get_user(user_id)
+        if user is not None:
+            cache.set(key, user_to_cache(user), timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(USER_KEY.format(user_id))
+
+
+class CachedModelBackend(CachedUserMixin, ModelBackend):
+    """
+    Django's username and password backend, with cached session users.
+
+    Logins with an @ are left to EmailAuthBackend, which also matches them
+    against usernames, so that a failed login checks one password hash.
+    """
     def authenticate(self, request, username=None, password=None, **kwargs):
-        user_model = get_user_model()
-        try:
-            user = user_model.objects.get(email=username)
-            if user.check_password(password):
-                return user
-            return None
-        except (user_model.DoesNotExist, user_model.MultipleObjectsReturned):
+        if username is None:
+            username = kwargs.get(get_user_model().USERNAME_FIELD)
+        if username is not None and '@' in username:
             return None
+        return super().authenticate(request, username, password, **kwargs)
 
-    def get_user(self, user_id):
+
+class EmailAuthBackend(CachedModelBackend):
+    """
+    Log in with an email address instead of a username, ignoring case.
+
+    The lookup matches the unique index on LOWER(email), and the username
+    index in the same query, since usernames may contain an @ too: a user
+    whose username is the login wins over one whose email is. Logins
+    without an @ cannot be emails, so they are left to the username backend
+    without a query.
+    """
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None or password is None or '@' not in username:
+            return None
         user_model = get_user_model()
-        try:
-            return user_model.objects.get(pk=user_id)
-        except user_model.DoesNotExist:
+        email = user_model.objects.normalize_email(username.strip()).lower()
+        is_username = Q(**{user_model.USERNAME_FIELD: username})
+        user = (
+            user_model.objects.alias(email_lower=Lower('email'))
+            .filter(is_username | (Q(email_lower=email) & ~Q(email='')))
+            .order_by(Case(When(is_username, then=0), default=1))
+            .first()
+        )
+        if user is None:
+            # Hash anyway, so that the response time does not tell which emails exist.
+            user_model().set_password(password)
             return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -42,8 +42,8 @@ class SignInUserForm(UserCreationForm):
         }
 
     def clean_email(self):
-        email = self.cleaned_data['email']
-        if get_user_model().objects.filter(email=email).exists():
+        email = get_user_model().objects.normalize_email(self.cleaned_data['email'].strip())
+        if email and get_user_model().objects.filter(email__iexact=email).exists():
             raise forms.ValidationError('This email already exists')
         return email
 
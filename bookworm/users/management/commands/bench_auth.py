@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model, load_backend
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from books.management.commands.bench import bench_host, is_success, percentile
+
+
+class Command(BaseCommand):
+    help = ('Measure what authentication costs: the overhead of an authenticated request over an anonymous one, '
+            'loading the session user, and failed logins by username and by email.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Measured runs of the request benchmarks.')
+        parser.add_argument('--login-iterations', type=int, default=3,
+                            help='Measured runs of the login benchmarks, which hash a password each time.')
+        parser.add_argument('--user', help='Username to log in as; defaults to the first user.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['login_iterations'] < 1:
+            raise CommandError('--iterations and --login-iterations must be positive.')
+        users = get_user_model().objects.order_by('pk')
+        user = users.filter(username=options['user']).first() if options['user'] else users.first()
+        if user is None:
+            raise CommandError('There are no users to log in as.')
+
+        url = reverse('about')
+        host = bench_host()
+        anonymous, logged_in = Client(HTTP_HOST=host), Client(HTTP_HOST=host)
+        logged_in.force_login(user)
+        backend = load_backend(settings.AUTHENTICATION_BACKENDS[0])
+
+        def get(client):
+            response = client.get(url)
+            if not is_success(response.status_code):
+                raise CommandError(f'{url} answered {response.status_code}, so its timings would not be meaningful.')
+
+        runs = options['iterations']
+        results = [
+            ('anonymous request', self.measure(lambda: get(anonymous), runs)),
+            ('authenticated request', self.measure(lambda: get(logged_in), runs)),
+            ('load session user', self.measure(lambda: backend.get_user(user.pk), runs)),
+        ]
+        runs = options['login_iterations']
+        results += [
+            ('failed username login', self.measure(lambda: authenticate(username='no-such-user', password='x'), runs)),
+            ('failed email login', self.measure(lambda: authenticate(username='nobody@example.invalid',
+                                                                     password='x'), runs)),
+        ]
+
+        self.stdout.write(f"{'benchmark':<24} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9} {'queries':>7}")
+        for name, (timings, queries) in results:
+            self.stdout.write(f'{name:<24} {percentile(timings, 0.5):>9.3f} {percentile(timings, 0.95):>9.3f} '
+                              f'{statistics.fmean(timings):>9.3f} {queries:>7}')
+        overhead = statistics.fmean(results[1][1][0]) - statistics.fmean(results[0][1][0])
+        self.stdout.write(self.style.SUCCESS(
+            f'Authenticated request overhead: {overhead:.3f} ms, '
+            f'{results[1][1][1] - results[0][1][1]:+d} queries'
+        ))
+
+    @staticmethod
+    def measure(run, iterations):
+        """
+        Time a callable, after one unmeasured run.
+
+        Returns:
+            tuple: The timings in milliseconds and the most queries of a run.
+        """
+        run()
+        timings, queries = [], 0
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, len(captured))
+        return timings, queries
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.1 on 2024-04-29 10:00
+
+from django.contrib.auth.base_user import BaseUserManager
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+def normalize_emails(apps, schema_editor):
+    """
+    Normalize the stored emails and clear the duplicates, ignoring case, so
+    that the unique index can be built. The oldest account keeps an address.
+    """
+    User = apps.get_model('users', 'User')
+    seen = set()
+    changed = []
+    for user in User.objects.order_by('pk').only('pk', 'email').iterator():
+        email = BaseUserManager.normalize_email(user.email.strip())
+        if email and email.lower() in seen:
+            email = ''
+        elif email:
+            seen.add(email.lower())
+        if email != user.email:
+            user.email = email
+            changed.append(user)
+    User.objects.bulk_update(changed, ['email'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_date_birth'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'),
+                                               condition=models.Q(('email', ''), _negated=True),
+                                               name='unique_user_email_ci'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.1 on 2026-10-18 16:10
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import migrations
+from django.utils import timezone
+
+OLD_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+NEW_BACKEND = 'users.authentication.CachedModelBackend'
+# The engines that keep the sessions in the django_session table.
+DB_ENGINES = ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db')
+
+
+def rewrite_backends(apps, schema_editor, old=OLD_BACKEND, new=NEW_BACKEND):
+    """
+    Point the stored sessions logged in through one backend at another, so
+    that the old one can leave AUTHENTICATION_BACKENDS without logging
+    anyone out. Sessions are remembered by backend path, which must be listed.
+    """
+    if settings.SESSION_ENGINE not in DB_ENGINES:
+        return
+    Session = apps.get_model('sessions', 'Session')
+    store = SessionStore()
+    changed = []
+    for session in Session.objects.filter(expire_date__gt=timezone.now()).iterator():
+        data = store.decode(session.session_data)
+        if data.get('_auth_user_backend') == old:
+            data['_auth_user_backend'] = new
+            session.session_data = store.encode(data)
+            changed.append(session)
+    Session.objects.bulk_update(changed, ['session_data'], batch_size=500)
+
+
+def restore_backends(apps, schema_editor):
+    rewrite_backends(apps, schema_editor, old=NEW_BACKEND, new=OLD_BACKEND)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sessions', '0001_initial'),
+        ('users', '0003_user_email_unique_ci'),
+    ]
+
+    operations = [
+        migrations.RunPython(rewrite_backends, restore_backends),
+    ]
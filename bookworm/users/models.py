@@ -1,6 +1,8 @@
 from datetime import date
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
 
 
 class User(AbstractUser):
@@ -11,8 +13,13 @@ class User(AbstractUser):
         avatar (ImageField, optional): User's profile picture.
         date_birth (DateField, optional): User's date of birth.
 
+    Email addresses are unique regardless of case, so that they can be
+    used to log in; several users may have none.
+
     Methods:
         get_user_age(): Calculate the user's age based on the date of birth.
+        get_session_auth_hash(): Use the session hash cached with the user,
+            if it was loaded from the cache without its password.
 
     """
     avatar = models.ImageField(
@@ -25,6 +32,26 @@ class User(AbstractUser):
         null=True
     )
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            models.UniqueConstraint(Lower('email'), condition=~Q(email=''), name='unique_user_email_ci'),
+        ]
+
+    def get_session_auth_hash(self):
+        if self._has_cached_session_hashes():
+            return self._session_auth_hashes[0]
+        return super().get_session_auth_hash()
+
+    def get_session_auth_fallback_hash(self):
+        if self._has_cached_session_hashes():
+            yield from self._session_auth_hashes[1:]
+        else:
+            yield from super().get_session_auth_fallback_hash()
+
+    def _has_cached_session_hashes(self):
+        # Users from the auth cache (see authentication.py) have the hashes but not the password, until it is set.
+        return hasattr(self, '_session_auth_hashes') and 'password' not in self.__dict__
+
     def get_user_age(self):
         """
         Calculate the user's age based on the date of birth.
@@ -34,6 +61,7 @@ class User(AbstractUser):
         """
         if self.date_birth:
             today = date.today()
-            age = today.year - self.date_birth.year - ((today.month, today.day) < (self.date_birth.month, self.date_birth.day))
+            birthday_to_come = (today.month, today.day) < (self.date_birth.month, self.date_birth.day)
+            age = today.year - self.date_birth.year - birthday_to_come
             return age
         return None
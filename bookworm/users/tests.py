@@ -0,0 +1,119 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .authentication import USER_KEY, CachedModelBackend
+
+rewrite_session_backends = import_module('users.migrations.0004_rewrite_session_backends')
+
+
+class CountingHasher(MD5PasswordHasher):
+    """
+    A fast hasher that counts the passwords it hashes, checks included.
+    """
+    calls = 0
+
+    def encode(self, password, salt):
+        CountingHasher.calls += 1
+        return super().encode(password, salt)
+
+
+@override_settings(PASSWORD_HASHERS=['users.tests.CountingHasher'])
+class LoginCostTests(TestCase):
+    """
+    A login, failed or not, checks one password hash with one query,
+    whichever backend it ends up with.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        user_model = get_user_model()
+        cls.reader = user_model.objects.create_user('reader', 'Reader@Example.com', 'secret')
+        cls.at_reader = user_model.objects.create_user('at@reader', 'other@example.com', 'secret')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        CountingHasher.calls = 0
+
+    def assertLoginCost(self, username, password, expected):
+        CountingHasher.calls = 0
+        with self.assertNumQueries(1):
+            user = authenticate(username=username, password=password)
+        self.assertEqual(user, expected)
+        self.assertEqual(CountingHasher.calls, 1)
+
+    def test_failed_logins_check_one_hash(self):
+        for username, password in [
+            ('reader', 'wrong'),
+            ('nobody', 'secret'),
+            ('reader@example.com', 'wrong'),
+            ('nobody@example.com', 'secret'),
+            ('at@reader', 'wrong'),
+        ]:
+            with self.subTest(username=username, password=password):
+                self.assertLoginCost(username, password, None)
+
+    def test_logins_by_username_or_email(self):
+        for username, expected in [
+            ('reader', self.reader),
+            ('READER@example.com', self.reader),
+            (' reader@EXAMPLE.com ', self.reader),
+            ('at@reader', self.at_reader),
+            ('Other@Example.com', self.at_reader),
+        ]:
+            with self.subTest(username=username):
+                self.assertLoginCost(username, 'secret', expected)
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user('reader', password='secret')
+
+    def test_session_users_are_cached_without_their_password(self):
+        backend = CachedModelBackend()
+        with self.assertNumQueries(1):
+            backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            user = backend.get_user(self.user.pk)
+        self.assertEqual((user.pk, user.username), (self.user.pk, 'reader'))
+        self.assertNotIn(self.user.password, repr(cache.get(USER_KEY.format(self.user.pk))))
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('secret'))
+
+    def test_saving_a_user_drops_it_and_a_new_password_ends_its_sessions(self):
+        self.client.force_login(self.user, backend='users.authentication.CachedModelBackend')
+        profile = reverse('users:change_profile')
+        self.assertEqual(self.client.get(profile).status_code, 200)
+
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertIsNone(cache.get(USER_KEY.format(self.user.pk)))
+        self.assertRedirects(self.client.get(profile), f"{reverse('users:login')}?next={profile}")
+
+
+class SessionBackendMigrationTests(TestCase):
+    def test_sessions_of_the_plain_backend_move_to_the_cached_one(self):
+        sessions = {}
+        for backend in (rewrite_session_backends.OLD_BACKEND, 'users.authentication.EmailAuthBackend'):
+            session = SessionStore()
+            session.update({'_auth_user_id': '1', '_auth_user_backend': backend})
+            session.create()
+            sessions[backend] = session.session_key
+
+        rewrite_session_backends.rewrite_backends(apps, None)
+
+        backends = {
+            backend: SessionStore(session_key)['_auth_user_backend'] for backend, session_key in sessions.items()
+        }
+        self.assertEqual(backends, {
+            rewrite_session_backends.OLD_BACKEND: rewrite_session_backends.NEW_BACKEND,
+            'users.authentication.EmailAuthBackend': 'users.authentication.EmailAuthBackend',
+        })
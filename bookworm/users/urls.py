@@ -1,11 +1,15 @@
 from django.contrib.auth.views import LogoutView, PasswordChangeDoneView, PasswordResetView, PasswordResetDoneView, \
     PasswordResetConfirmView, PasswordResetCompleteView
+from django.conf import settings
 from django.urls import path, reverse_lazy
 from . import views
+from . import async_views
 from .forms import UserPasswordResetForm, UserSetPasswordForm
 
 app_name = 'users'
 
+read_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     path('login/', views.LoginUser.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
@@ -32,6 +36,6 @@ urlpatterns = [
          PasswordResetCompleteView.as_view(template_name='users/password_reset_complete.html'),
          name='password_reset_complete'),
     path('signin/', views.SignInUser.as_view(), name='signin'),
-    path('profile/<int:pk>/', views.ProfileUser.as_view(), name='profile'),
+    path('profile/<int:pk>/', read_views.ProfileUser.as_view(), name='profile'),
     path('profile/change/', views.ChangeProfileInfo.as_view(), name='change_profile'),
 ]
@@ -1,12 +1,16 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView, PasswordChangeView
+from django.core.paginator import InvalidPage, PageNotAnInteger, Paginator
+from django.http import Http404
 from django.urls import reverse_lazy
+from django.utils.translation import gettext as _
 from django.views.generic import CreateView, UpdateView, DetailView
 
+from .activity import activity_rows, load_activity
 from .forms import LoginUserForm, SignInUserForm, ProfileUserForm, UserPasswordChangeForm
 
-from books.models import Book, Review
+from books.cache import get_user_activity_counts
 from bookworm import settings
 
 
@@ -39,19 +43,45 @@ class ChangeProfileInfo(LoginRequiredMixin, UpdateView):
 
 
 class ProfileUser(DetailView):
+    """
+    A user's profile with a paginated feed of the books they added and the
+    reviews they wrote.
+
+    The page count comes from the cached activity counters, so a page costs
+    the user query, the feed query and one query per kind of entry.
+    """
     model = get_user_model()
     template_name = 'users/profile.html'
     context_object_name = 'user'
     pk_url_kwarg = 'pk'
+    paginate_by = 10
+
+    def get_paginator(self, counts):
+        paginator = Paginator(activity_rows(self.kwargs[self.pk_url_kwarg]), self.paginate_by)
+        # count is a cached_property; the counters spare the COUNT over the union.
+        paginator.count = counts['books'] + counts['reviews']
+        return paginator
+
+    def get_page(self, paginator):
+        number = self.request.GET.get('page') or 1
+        if number == 'last':
+            number = paginator.num_pages
+        try:
+            return paginator.page(number)
+        except PageNotAnInteger:
+            raise Http404(_('Page is not “last”, nor can it be converted to an int.'))
+        except InvalidPage as e:
+            raise Http404(_('Invalid page (%(page_number)s): %(message)s') % {'page_number': number, 'message': str(e)})
 
     def get_context_data(self, **kwargs):
+        if 'activity' not in kwargs:
+            counts = get_user_activity_counts(self.object.pk)
+            paginator = self.get_paginator(counts)
+            page = self.get_page(paginator)
+            kwargs.update(counts=counts, paginator=paginator, page_obj=page, activity=load_activity(page.object_list))
         context = super().get_context_data(**kwargs)
-        user = self.get_object()
-        user_books = Book.published.filter(user=user)
-        user_reviews = Review.objects.filter(user=user)
+        user = self.object
 
-        context['user_books'] = user_books
-        context['user_reviews'] = user_reviews
         context['default_avatar'] = settings.DEFAULT_USER_AVATAR
         context['title'] = f'{user} profile'
         context['is_authenticated'] = self.request.user.is_authenticated
@@ -62,4 +92,3 @@ class UserPasswordChange(PasswordChangeView):
     form_class = UserPasswordChangeForm
     success_url = reverse_lazy('users:password_change_done')
     template_name = 'users/password_change_form.html'
-